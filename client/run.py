@@ -21,4 +21,5 @@ if __name__ == "__main__":
     root.report_callback_exception = report_callback_exception
     
     app = ISBNApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
\ No newline at end of file
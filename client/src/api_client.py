@@ -1,8 +1,79 @@
+import json
 import requests
+from requests.adapters import HTTPAdapter
 import logging
-import json
+import sqlite3
 from datetime import datetime
-import threading
+
+from .telemetry import TelemetryPolicy
+from .uploader import TelemetryUploader
+from .spool import TelemetrySpool
+
+LOG_FLUSH_TIMEOUT = 3.0 # 退出时等待剩余日志上报的最长时间（秒）
+BACKEND_POOL_SIZE = 4 # 与后端之间保持的最大连接数：日志上报、OCR、版本检查与采样策略各一
+
+class ApiResponse:
+    """
+    平台API响应的轻量封装。
+    可包装 `requests` 或 `httpx` 的响应。`json()` 最多解析一次响应体并缓存结果（解析失败时缓存异常）。
+    日志上报不共享这份解析结果，而是保存不可变的原始响应体，由上报线程解析，调用方之后修改返回的数据不会影响待上报的日志。布尔值与 `requests.Response` 一致，表示状态码是否成功；其余属性透传给原始响应。
+    """
+    __slots__ = ("raw", "_json", "_json_error", "_parsed")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._json = None
+        self._json_error = None
+        self._parsed = False
+
+    def __bool__(self):
+        return self.raw.status_code < 400
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    @property
+    def status_code(self):
+        return self.raw.status_code
+
+    def json(self):
+        """解析并缓存JSON响应体。"""
+        if not self._parsed:
+            try:
+                self._json = self.raw.json()
+            except ValueError as e:
+                self._json_error = e
+            self._parsed = True
+        if self._json_error is not None:
+            raise self._json_error
+        return self._json
+
+    def telemetry_info(self, include_headers=True):
+        """生成日志上报用的响应信息。响应体以原始字节保存在 `raw_body` 中，不在调用线程解析，由 `decode_telemetry_body` 在上报线程中还原。"""
+        info = {"status_code": self.raw.status_code, "body": None, "raw_body": (self.raw.content, self.raw.encoding)}
+        if include_headers:
+            info["headers"] = dict(self.raw.headers)
+        return info
+
+def decode_telemetry_body(response_info):
+    """将 `ApiResponse.telemetry_info` 保存的原始响应体解析为JSON，非JSON响应体截取前2000个字符。返回新的字典，不修改原对象。"""
+    if not response_info or "raw_body" not in response_info:
+        return response_info
+    response_info = dict(response_info)
+    content, encoding = response_info.pop("raw_body")
+    try:
+        response_info["body"] = json.loads(content)
+    except ValueError:
+        response_info["body"] = content.decode(encoding or 'utf-8', errors='replace')[:2000]
+    return response_info
+
+def create_backend_session():
+    """创建访问我们自己后端的共享会话，所有后端请求复用同一个连接池，避免每次都重新进行DNS解析、TCP与TLS握手。"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BACKEND_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 class ApiClient:
     """
@@ -15,6 +86,21 @@ class ApiClient:
         self.base_url = "https://univ.xinhua.sh.cn"
         self.base_backend_url = "https://api.school.starswhere.xyz:44" # 数据收集、OCR和版本检查后端地址
         self.student_info = {}
+        self.backend_session = create_backend_session()
+        self.telemetry_policy = TelemetryPolicy(f"{self.base_backend_url}/telemetry_config", self.backend_session)
+        try:
+            self.telemetry_spool = TelemetrySpool()
+        except sqlite3.Error as e:
+            logging.error(f"无法打开日志暂存文件，上报失败的日志将被丢弃: {e}")
+            self.telemetry_spool = None
+        self.uploader = TelemetryUploader(f"{self.base_backend_url}/log/batch", self.backend_session,
+                                          prepare=self._prepare_log, spool=self.telemetry_spool,
+                                          consent=lambda: bool(self.settings.get("allow_data_collection")))
+
+    def close(self):
+        """退出前在限定时间内上报剩余日志。"""
+        self.uploader.close(LOG_FLUSH_TIMEOUT)
+        self.backend_session.close()
 
     def get_api_headers(self, referer_path=""):
         """获取通用的API请求头。"""
@@ -32,72 +118,79 @@ class ApiClient:
             "Sec-Fetch-Site": "same-origin"
         }
 
+    def telemetry_stats(self):
+        """返回日志上报队列与本地暂存区的状态，供诊断界面显示。"""
+        return {
+            "uploader": self.uploader.stats(),
+            "spool": self.telemetry_spool.stats() if self.telemetry_spool is not None else None
+        }
+
     def _log_to_external_api(self, event_type, request_info, response_info=None, error_msg=None):
-        """将结构化日志发送到我们自己的后端。"""
+        """
+        将结构化日志放入后台上报队列，由 `TelemetryUploader` 批量发送到我们自己的后端。上报前先按后端下发的采样策略决定是否上报，未被采样的事件不做任何处理。
+        `request_info` 与 `response_info` 可以是返回字典的函数，只在确定上报时才调用。
+        尚未保存学生信息时（如登录过程中并发的请求），学生ID与学号取自请求参数。
+        """
         if not self.settings.get("allow_data_collection"):
             logging.info("用户已禁用数据收集,跳过日志上报。")
             return
-        
-        def task():
-            log_data = {
-                "event_type": event_type,
-                "student_id": self.student_info.get('studentID'),
-                "student_no": self.student_info.get('studentNo'),
-                "timestamp": datetime.utcnow().isoformat() + "Z",
-                "request": request_info,
-                "response": response_info,
-                "error": error_msg
-            }
-            try:
-                requests.post(f"{self.base_backend_url}/log", json=log_data, timeout=10)
-            except requests.exceptions.RequestException as e:
-                logging.error(f"发送日志到API失败: {e}")
-        
-        threading.Thread(target=task, name="ApiLogThread", daemon=True).start()
+
+        send, sample_rate = self.telemetry_policy.should_send(event_type)
+        if not send:
+            return
+        if callable(request_info):
+            request_info = request_info()
+        if callable(response_info):
+            response_info = response_info()
+
+        payload = (request_info or {}).get("payload")
+        if not isinstance(payload, dict):
+            payload = {}
+        log_data = {
+            "event_type": event_type,
+            "student_id": self.student_info.get('studentID') or payload.get('studentID'),
+            "student_no": self.student_info.get('studentNo') or payload.get('studentNo'),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "request": request_info,
+            "response": response_info,
+            "error": error_msg
+        }
+        if sample_rate < 1.0:
+            log_data["sample_rate"] = sample_rate
+        self.uploader.enqueue(log_data)
+
+    def _prepare_log(self, log_data):
+        """在上报线程中解析响应体，并按采样策略截断过大的请求参数与响应体。"""
+        log_data["request"], log_data["response"] = self.telemetry_policy.limit_sizes(
+            log_data["request"], decode_telemetry_body(log_data["response"])
+        )
+        return log_data
 
     def api_request(self, method, url, event_type="GENERIC_API_CALL", **kwargs):
         """
         统一的API请求封装,自动处理日志记录。
+        返回 `ApiResponse`（请求未得到响应时返回 None）。日志所需的请求与响应信息只在确定上报时才生成。
         """
-        request_payload = kwargs.get('json', kwargs.get('params', {}))
-        response = None
-        
-        request_info = {
-            "method": method, "url": url, "payload": request_payload,
-            "headers": {k: v for k, v in self.session.headers.items() if 'Cookie' not in k}
-        }
+        def request_info():
+            return {
+                "method": method, "url": url, "payload": kwargs.get('json', kwargs.get('params', {})),
+                "headers": {k: v for k, v in self.session.headers.items() if 'Cookie' not in k}
+            }
         
         try:
-            response = self.session.request(method, url, **kwargs)
-            response.raise_for_status()
-            
-            response_body = ""
-            try:
-                response_body = response.json()
-            except json.JSONDecodeError:
-                response_body = response.text[:2000]
-            
-            response_info = {
-                "status_code": response.status_code, "body": response_body,
-                "headers": dict(response.headers)
-            }
-            self._log_to_external_api(event_type + "_SUCCESS", request_info, response_info)
+            raw_response = self.session.request(method, url, **kwargs)
+            raw_response.raise_for_status()
+            response = ApiResponse(raw_response)
+            self._log_to_external_api(event_type + "_SUCCESS", request_info, response.telemetry_info)
             return response
             
         except requests.exceptions.RequestException as e:
             logging.error(f"API请求失败: {e}")
             
-            error_msg = str(e)
-            response_info = None
-            if e.response is not None:
-                try:
-                    body = e.response.json()
-                except json.JSONDecodeError:
-                    body = e.response.text[:2000]
-                response_info = {"status_code": e.response.status_code, "body": body}
-            
-            self._log_to_external_api(event_type + "_FAIL", request_info, response_info, error_msg)
-            return e.response if e.response is not None else None
+            response = ApiResponse(e.response) if e.response is not None else None
+            response_info = (lambda: response.telemetry_info(include_headers=False)) if response is not None else None
+            self._log_to_external_api(event_type + "_FAIL", request_info, response_info, str(e))
+            return response
 
     def send_forget_password_code(self, student_code, mobile_no):
         """为忘记密码功能发送短信验证码。"""
@@ -139,7 +232,7 @@ class ApiClient:
         
         try:
             logging.info(f"正在通过后端代理调用OCR服务: {ocr_url}")
-            response = requests.post(ocr_url, json=payload, headers=headers, timeout=10)
+            response = self.backend_session.post(ocr_url, json=payload, headers=headers, timeout=10)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -155,7 +248,7 @@ class ApiClient:
         version_check_url = f"{self.base_backend_url}/version_check?client_version={client_version}"
         try:
             logging.info(f"正在检查版本更新: {version_check_url}")
-            response = requests.get(version_check_url, timeout=10)
+            response = self.backend_session.get(version_check_url, timeout=10)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
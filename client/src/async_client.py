@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import threading
+
+import httpx
+
+from .api_client import ApiResponse
+
+PLATFORM_MAX_CONCURRENCY = 4 # 同时发往平台的最大请求数
+LOOP_CLOSE_TIMEOUT = 3.0 # 退出时等待事件循环线程结束的最长时间（秒）
+
+class AsyncApiClient:
+    """
+    平台API的异步版本，基于 `httpx.AsyncClient`，运行在独立的事件循环线程中。
+    与 `ApiClient` 共享同一个Cookie容器（每次请求前取 `ApiClient.session.cookies`，会话被替换后也能跟上），
+    日志上报也沿用 `ApiClient` 的采样与上报队列。并发请求数由信号量限制，互不依赖的请求可以同时进行，
+    总耗时接近其中最慢的一个而不是逐个相加。
+    """
+    def __init__(self, api_client, max_concurrency=PLATFORM_MAX_CONCURRENCY):
+        self.api_client = api_client
+        self.base_url = api_client.base_url
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._client = httpx.AsyncClient(
+            cookies=api_client.session.cookies,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="PlatformEventLoop", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        # 信号量必须在事件循环线程中创建：Python 3.9 及更早版本在创建时就绑定当前线程的事件循环。
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._loop.run_forever()
+        self._loop.close()
+
+    def submit(self, coro):
+        """在事件循环线程中运行协程，不等待，返回 `concurrent.futures.Future`。"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro, timeout=None):
+        """在事件循环线程中运行协程并等待结果。不能在事件循环线程内调用。"""
+        return self.submit(coro).result(timeout)
+
+    def close(self):
+        """关闭连接池并停止事件循环线程。"""
+        try:
+            self.run(self._client.aclose(), LOOP_CLOSE_TIMEOUT)
+        except Exception as e:
+            logging.warning(f"关闭异步平台连接时出错: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(LOOP_CLOSE_TIMEOUT)
+
+    async def fetch_all(self, *coros):
+        """同时执行多个互不依赖的请求，按传入顺序返回结果。并发数仍受信号量限制。"""
+        return await asyncio.gather(*coros)
+
+    async def api_request(self, method, url, event_type="GENERIC_API_CALL", **kwargs):
+        """
+        `ApiClient.api_request` 的协程版本，参数与返回值相同。
+        返回 `ApiResponse`（请求未得到响应时返回 None），日志所需信息同样只在确定上报时才生成。
+        """
+        session = self.api_client.session
+        if self._client.cookies.jar is not session.cookies:
+            self._client.cookies = session.cookies
+
+        def request_info():
+            return {
+                "method": method, "url": url, "payload": kwargs.get('json', kwargs.get('params', {})),
+                "headers": {k: v for k, v in session.headers.items() if 'Cookie' not in k}
+            }
+
+        try:
+            async with self._semaphore:
+                raw_response = await self._client.request(method, url, **kwargs)
+            raw_response.raise_for_status()
+            response = ApiResponse(raw_response)
+            self.api_client._log_to_external_api(event_type + "_SUCCESS", request_info, response.telemetry_info)
+            return response
+
+        except httpx.HTTPError as e:
+            logging.error(f"API请求失败: {e}")
+
+            response = ApiResponse(e.response) if isinstance(e, httpx.HTTPStatusError) else None
+            response_info = (lambda: response.telemetry_info(include_headers=False)) if response is not None else None
+            self.api_client._log_to_external_api(event_type + "_FAIL", request_info, response_info, str(e))
+            return response
+
+    async def get_student_info(self, student_id):
+        """获取学生信息。"""
+        url = f"{self.base_url}/api/GetStudentInfo.do"
+        headers = self.api_client.get_api_headers("myBook.do")
+        return await self.api_request("POST", url, event_type="GET_STUDENT_INFO", json={"studentID": student_id}, headers=headers, timeout=10)
+
+    async def get_book_list(self, student_id=None):
+        """获取可订购的教材列表。未指定 `student_id` 时使用当前登录的学生。"""
+        url = f"{self.base_url}/api/GetBookList.do"
+        headers = self.api_client.get_api_headers("myBook.do")
+        param = {"studentID": student_id or self.api_client.student_info.get('studentID')}
+        return await self.api_request("POST", url, event_type="GET_BOOK_LIST", json=param, headers=headers, timeout=10)
+
+    async def get_order_list(self, history_sign="100"):
+        """获取历史订单列表。"""
+        url = f"{self.base_url}/api/GetOrderList.do"
+        headers = self.api_client.get_api_headers("myOrder.do")
+        param = {"studentID": self.api_client.student_info.get('studentID'), "historySign": history_sign}
+        return await self.api_request("POST", url, event_type="GET_ORDER_HISTORY", json=param, headers=headers, timeout=10)
+
+    async def get_order(self, order_id):
+        """获取订单详情。"""
+        url = f"{self.base_url}/api/GetOrder.do"
+        headers = self.api_client.get_api_headers(f"order.do?order_id={order_id}")
+        param = {"studentID": self.api_client.student_info.get('studentID'), "orderID": order_id}
+        return await self.api_request("POST", url, event_type="GET_ORDER_DETAIL", json=param, headers=headers, timeout=10)
+
+    async def get_orders(self, order_ids):
+        """同时获取多个订单的详情，按传入顺序返回。"""
+        return await self.fetch_all(*(self.get_order(order_id) for order_id in order_ids))
@@ -10,9 +10,11 @@ import webbrowser
 
 from .settings import AppSettings
 from .api_client import ApiClient
+from .async_client import AsyncApiClient
 from .ui import base_view, login_view, book_view, order_view, user_view
 
 CLIENT_VERSION = "1.1.0" 
+ASYNC_POLL_INTERVAL = 20 # 界面线程检查异步请求是否完成的间隔（毫秒）
 
 class ISBNApp:
     """
@@ -31,10 +33,12 @@ class ISBNApp:
         
         self.settings = AppSettings()
         self.api_client = ApiClient(self.settings)
+        self.async_client = AsyncApiClient(self.api_client)
         self.session_file = "session_data.json"
         
         self.book_widgets = {}
         self.all_books_data = []
+        self.prefetched_book_list = None
         self.current_order_data = None
         
         base_view.setup_styles()
@@ -44,6 +48,32 @@ class ISBNApp:
             self.show_login_page()
             self._check_for_updates_on_startup()
 
+    def on_close(self):
+        """关闭主窗口：停止异步请求线程，在限定时间内上报剩余日志后退出。"""
+        self.async_client.close()
+        self.api_client.close()
+        self.root.destroy()
+
+    def run_async(self, coro, callback):
+        """
+        在异步请求线程中运行协程，完成后在界面线程中以结果调用 `callback`。
+        界面线程只通过 `after` 轮询结果，不会被网络请求阻塞，也不会在其他线程中操作Tk控件。
+        """
+        future = self.async_client.submit(coro)
+
+        def poll():
+            if not future.done():
+                self.root.after(ASYNC_POLL_INTERVAL, poll)
+                return
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"异步请求出错: {e}")
+                result = None
+            callback(result)
+
+        self.root.after(ASYNC_POLL_INTERVAL, poll)
+
     def center_window(self):
         self.root.update_idletasks()
         width = self.root.winfo_width()
@@ -189,6 +219,7 @@ class ISBNApp:
         """清除本地会话数据。"""
         self.api_client.session = requests.Session()
         self.api_client.student_info = {}
+        self.prefetched_book_list = None
         if os.path.exists(self.session_file):
             os.remove(self.session_file)
 
@@ -212,9 +243,19 @@ class ISBNApp:
             result = response.json()
             if result.get("code") == "0":
                 student_id = result.get("data")
-                if self.get_student_info(student_id):
-                    self.save_session_data()
-                    self._post_login_actions()
+                # 学生信息与教材列表只依赖学生ID，在异步请求线程中同时请求，界面不等待；
+                # 教材列表留给随后打开的选购界面直接使用。
+                def on_loaded(responses):
+                    info_response, book_response = responses or (None, None)
+                    if self.apply_student_info(info_response):
+                        self.prefetched_book_list = book_response
+                        self.save_session_data()
+                        self._post_login_actions()
+
+                self.run_async(self.async_client.fetch_all(
+                    self.async_client.get_student_info(student_id),
+                    self.async_client.get_book_list(student_id),
+                ), on_loaded)
             else:
                 messagebox.showerror("登录失败", result.get("errorMsg", "未知错误"))
                 self.show_login_page()
@@ -228,6 +269,10 @@ class ISBNApp:
         param = {"studentID": student_id}
         headers = self.api_client.get_api_headers("myBook.do")
         response = self.api_client.api_request("POST", url, event_type="GET_STUDENT_INFO", json=param, headers=headers, timeout=10)
+        return self.apply_student_info(response)
+
+    def apply_student_info(self, response):
+        """从学生信息响应中保存当前学生信息，失败时提示。"""
         if response and response.status_code == 200:
             result = response.json()
             if result.get("code") == "0" and result.get("data"):
@@ -369,6 +414,51 @@ class ISBNApp:
                 messagebox.showerror("失败", result.get("errorMsg", "取消订单失败"))
         return False
 
+    def show_diagnostics(self):
+        """显示日志上报诊断信息：上报队列、本地暂存区的大小、最早日志的等待时间与回放速率，每秒刷新。"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("诊断信息")
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+
+        main_frame = ttk.Frame(dialog, padding=15)
+        main_frame.pack(fill="both", expand=True)
+        ttk.Label(main_frame, text="日志上报状态", style="Title.TLabel").grid(row=0, column=0, columnspan=2)
+
+        rows = [
+            ("queued", "待上报条数"),
+            ("totalSent", "已上报条数"),
+            ("totalDropped", "已丢弃条数"),
+            ("spoolEvents", "本地暂存条数"),
+            ("spoolSize", "本地暂存大小"),
+            ("spoolAge", "最早暂存日志等待时间"),
+            ("drainRate", "最近一次回放速率"),
+            ("totalEvicted", "超出容量被删除条数"),
+        ]
+        value_vars = {}
+        for index, (key, text) in enumerate(rows, start=1):
+            ttk.Label(main_frame, text=f"{text}:").grid(row=index, column=0, sticky="w", padx=(0, 10), pady=2)
+            value_vars[key] = tk.StringVar()
+            ttk.Label(main_frame, textvariable=value_vars[key]).grid(row=index, column=1, sticky="w", pady=2)
+        ttk.Button(main_frame, text="关闭", command=dialog.destroy).grid(row=len(rows) + 1, column=0, columnspan=2, pady=(10, 0))
+
+        def refresh():
+            if not dialog.winfo_exists():
+                return
+            stats = self.api_client.telemetry_stats()
+            uploader, spool = stats["uploader"], stats["spool"] or {}
+            value_vars["queued"].set(str(uploader["queued"]))
+            value_vars["totalSent"].set(str(uploader["totalSent"]))
+            value_vars["totalDropped"].set(str(uploader["totalDropped"]))
+            value_vars["spoolEvents"].set(str(spool.get("events", "不可用")))
+            value_vars["spoolSize"].set(f"{spool.get('bytes', 0) / 1024:.1f} KB / {spool.get('maxBytes', 0) / 1024 / 1024:.0f} MB")
+            value_vars["spoolAge"].set(f"{spool.get('oldestAge', 0):.0f} 秒")
+            value_vars["drainRate"].set(f"{spool.get('lastDrainRate', 0):.1f} 条/秒")
+            value_vars["totalEvicted"].set(str(spool.get("totalEvicted", 0)))
+            dialog.after(1000, refresh)
+
+        refresh()
+
     def show_payment_confirmation(self, payment_type, callback):
         """显示支付确认界面，包含免责声明和强制阅读时间。"""
         confirmation_window = tk.Toplevel(self.root)
@@ -0,0 +1,109 @@
+import logging
+import sqlite3
+import threading
+import time
+
+SPOOL_FILE = "telemetry_spool.db" # 上报失败的日志暂存文件
+SPOOL_MAX_BYTES = 20 * 1024 * 1024 # 暂存文件中日志内容的最大字节数，超出时删除最早的批次
+
+class TelemetrySpool:
+    """
+    上报失败日志的本地暂存区。
+    每个无法上报的批次以gzip压缩后的JSON数组保存为SQLite表中的一行，总大小超过上限时删除最早的批次；
+    上报线程在下一次成功连接后台后按写入顺序回放。统计数据保存在内存中，界面读取时不访问数据库。
+    """
+    def __init__(self, path=SPOOL_FILE, max_bytes=SPOOL_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, "
+            "event_count INTEGER NOT NULL, body BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        row = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(event_count), 0), COALESCE(SUM(LENGTH(body)), 0), MIN(created_at) FROM spool"
+        ).fetchone()
+        self.batches, self.events, self.bytes, self.oldest = row
+
+        self.total_spooled = 0
+        self.total_drained = 0
+        self.total_evicted = 0
+        self.last_drain_rate = 0.0
+
+    def append(self, body, event_count):
+        """保存一个gzip压缩的日志批次，超出大小上限时删除最早的批次。"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT INTO spool (created_at, event_count, body) VALUES (?, ?, ?)",
+                               (now, event_count, body))
+            self.batches += 1
+            self.events += event_count
+            self.bytes += len(body)
+            self.oldest = self.oldest or now
+            self.total_spooled += event_count
+            while self.bytes > self.max_bytes and self.batches > 1:
+                row = self._conn.execute(
+                    "SELECT id, event_count, LENGTH(body) FROM spool ORDER BY id LIMIT 1"
+                ).fetchone()
+                self._conn.execute("DELETE FROM spool WHERE id = ?", (row[0],))
+                self._forget(row[1], row[2])
+                self.total_evicted += row[1]
+            self._conn.commit()
+        logging.warning(f"日志上报失败，{event_count} 条日志已暂存到本地。")
+
+    def peek(self):
+        """返回最早的一个批次 `(id, 条数, 内容)`，暂存区为空时返回 None。"""
+        with self._lock:
+            return self._conn.execute("SELECT id, event_count, body FROM spool ORDER BY id LIMIT 1").fetchone()
+
+    def remove(self, batch_id):
+        """删除已成功回放的批次。"""
+        with self._lock:
+            row = self._conn.execute("SELECT event_count, LENGTH(body) FROM spool WHERE id = ?", (batch_id,)).fetchone()
+            if row is None:
+                return
+            self._conn.execute("DELETE FROM spool WHERE id = ?", (batch_id,))
+            self._conn.commit()
+            self._forget(*row)
+            self.total_drained += row[0]
+
+    def clear(self):
+        """删除全部暂存的批次，返回删除的日志条数。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM spool")
+            self._conn.commit()
+            events = self.events
+            self.batches, self.events, self.bytes, self.oldest = 0, 0, 0, None
+        return events
+
+    def is_empty(self):
+        return self.batches == 0
+
+    def stats(self):
+        """返回暂存区的条数、大小、最早日志的等待时间与最近一次回放速率。"""
+        return {
+            "events": self.events,
+            "bytes": self.bytes,
+            "maxBytes": self.max_bytes,
+            "oldestAge": time.time() - self.oldest if self.oldest else 0.0,
+            "lastDrainRate": self.last_drain_rate,
+            "totalSpooled": self.total_spooled,
+            "totalDrained": self.total_drained,
+            "totalEvicted": self.total_evicted,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _forget(self, event_count, size):
+        self.batches -= 1
+        self.events -= event_count
+        self.bytes -= size
+        if self.batches == 0:
+            self.oldest = None
+        else:
+            self.oldest = self._conn.execute("SELECT MIN(created_at) FROM spool").fetchone()[0]
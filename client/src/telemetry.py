@@ -0,0 +1,88 @@
+import json
+import logging
+import random
+import threading
+import time
+
+import requests
+
+DEFAULT_POLICY_TTL = 300 # 后端未指定时采样策略的缓存时长（秒）
+POLICY_RETRY_INTERVAL = 60 # 获取采样策略失败后的重试间隔（秒）
+
+class TelemetryPolicy:
+    """
+    后端下发的日志采样策略。
+    策略缓存在内存中，过期后由后台线程携带ETag重新获取，判断是否上报始终只读取本地缓存，不会阻塞调用方。
+    在首次获取成功之前以及后端不可用时，沿用上一次的策略（初始为全部上报）。
+    """
+    def __init__(self, config_url, session):
+        self.config_url = config_url
+        self.session = session
+        self._policy = {}
+        self._etag = None
+        self._expires_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def sample_rate(self, event_type):
+        """返回该事件类型的采样率，始终保留的事件返回 1.0。"""
+        self._refresh_if_expired()
+        policy = self._policy
+        if any(event_type.endswith(suffix) for suffix in policy.get("alwaysKeepSuffixes", [])):
+            return 1.0
+        return policy.get("sampleRates", {}).get(event_type, policy.get("defaultSampleRate", 1.0))
+
+    def should_send(self, event_type):
+        """按采样率决定是否上报该事件，返回 `(是否上报, 采样率)`。"""
+        rate = self.sample_rate(event_type)
+        return rate >= 1.0 or random.random() < rate, rate
+
+    def limit_sizes(self, request_info, response_info):
+        """按策略中的大小上限截断请求参数与响应体，返回新的字典，不修改原对象。超限的字段替换为带预览的截断标记。"""
+        request_info = self._limit(request_info, "payload", self._policy.get("maxRequestPayloadBytes"))
+        response_info = self._limit(response_info, "body", self._policy.get("maxResponseBodyBytes"))
+        return request_info, response_info
+
+    def _limit(self, info, field, max_bytes):
+        if not info or max_bytes is None or info.get(field) is None:
+            return info
+        value = info[field]
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        data = text.encode('utf-8')
+        if len(data) <= max_bytes:
+            return info
+        # 截断后仍保持为对象，以符合后端对请求参数字段的类型要求。
+        limited = dict(info)
+        limited[field] = {"truncated": True, "size": len(data),
+                          "preview": data[:max_bytes].decode('utf-8', errors='ignore')}
+        return limited
+
+    def _refresh_if_expired(self):
+        if time.monotonic() < self._expires_at:
+            return
+        with self._lock:
+            if self._refreshing or time.monotonic() < self._expires_at:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name="TelemetryPolicyThread", daemon=True).start()
+
+    def _refresh(self):
+        ttl = POLICY_RETRY_INTERVAL
+        try:
+            headers = {"If-None-Match": self._etag} if self._etag else {}
+            response = self.session.get(self.config_url, headers=headers, timeout=10)
+            if response.status_code == 304:
+                ttl = self._policy.get("ttlSeconds", DEFAULT_POLICY_TTL)
+            else:
+                response.raise_for_status()
+                policy = response.json()
+                self._policy = policy
+                self._etag = response.headers.get("ETag")
+                ttl = policy.get("ttlSeconds", DEFAULT_POLICY_TTL)
+                logging.info(f"已更新日志采样策略，默认采样率: {policy.get('defaultSampleRate', 1.0)}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.warning(f"获取日志采样策略失败，继续使用当前策略: {e}")
+        finally:
+            with self._lock:
+                self._expires_at = time.monotonic() + ttl
+                self._refreshing = False
@@ -22,12 +22,15 @@ def create_book_selection_view(app):
             widget.destroy()
         app.book_widgets.clear()
         
-        url = f"{app.api_client.base_url}/api/GetBookList.do"
-        headers = app.api_client.get_api_headers("myBook.do")
-        param = {"studentID": app.api_client.student_info.get('studentID')}
-        
-        response = app.api_client.api_request("POST", url, event_type="GET_BOOK_LIST", json=param, headers=headers, timeout=10)
-        
+        prefetched, app.prefetched_book_list = app.prefetched_book_list, None
+        if prefetched is not None:
+            show_book_list(prefetched)
+        else:
+            app.run_async(app.async_client.get_book_list(), show_book_list)
+
+    def show_book_list(response):
+        if not books_frame.winfo_exists():
+            return
         if response and response.status_code == 200:
             result = response.json()
             if result.get("code") == "0":
@@ -156,6 +159,7 @@ def create_book_selection_view(app):
     ttk.Button(action_frame, text="刷新列表", command=load_book_list).pack(side=tk.LEFT, padx=5)
     ttk.Button(action_frame, text="导出列表", command=export_book_data).pack(side=tk.LEFT, padx=5)
     ttk.Button(action_frame, text="历史订单", command=app.show_order_history_page).pack(side=tk.LEFT, padx=5)
+    ttk.Button(action_frame, text="诊断信息", command=app.show_diagnostics).pack(side=tk.LEFT, padx=5)
     ttk.Button(action_frame, text="登出", command=app.logout).pack(side=tk.LEFT, padx=5)
     
     list_container = ttk.LabelFrame(main_frame, text="可订购教材")
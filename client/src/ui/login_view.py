@@ -32,6 +32,8 @@ def create_login_view(app):
         app.settings.set("save_credentials", save_credentials_var.get())
         app.settings.set("allow_data_collection", allow_logging_var.get())
         app.settings.save()
+        if not allow_logging_var.get():
+            app.api_client.uploader.discard()
 
         app.login(student_no, password, verify_code)
 
@@ -17,12 +17,11 @@ def create_order_history_view(app):
 
     def load_order_history():
         for i in order_history_tree.get_children(): order_history_tree.delete(i)
-        
-        url = f"{app.api_client.base_url}/api/GetOrderList.do"
-        headers = app.api_client.get_api_headers("myOrder.do")
-        param = {"studentID": app.api_client.student_info.get('studentID'), "historySign": "100"}
-        
-        response = app.api_client.api_request("POST", url, event_type="GET_ORDER_HISTORY", json=param, headers=headers, timeout=10)
+        app.run_async(app.async_client.get_order_list(), show_order_history)
+
+    def show_order_history(response):
+        if not order_history_tree.winfo_exists():
+            return
         if response and response.status_code == 200:
             result = response.json()
             if result.get("code") == "0":
@@ -0,0 +1,223 @@
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+
+LOG_COMPRESS_THRESHOLD = 1024 # 超过该字节数的日志上报内容使用gzip压缩
+UPLOAD_QUEUE_SIZE = 2000 # 待上报日志的最大条数，超出时丢弃最早的日志
+UPLOAD_BATCH_SIZE = 50 # 每次批量上报的最大条数
+UPLOAD_MAX_AGE = 2.0 # 日志在队列中等待的最长时间（秒），超过后即使不满一批也上报
+UPLOAD_MAX_RETRIES = 3 # 单批上报失败后的最大重试次数
+UPLOAD_BACKOFF_BASE = 0.5 # 重试退避的基准时间（秒）
+UPLOAD_BACKOFF_MAX = 10.0 # 重试退避的最长时间（秒）
+SPOOL_RETRY_INTERVAL = 60.0 # 空闲时尝试回放本地暂存日志的间隔（秒）
+CLOSE_SPOOL_GRACE = 1.0 # 退出时在上报截止时间之后额外等待写入本地暂存区的时间（秒）
+
+class TelemetryUploader:
+    """
+    后台日志上报器。
+    日志进入有界队列后由单个长期运行的线程按数量或等待时间合并为一批，通过共享的后端会话上报到 `/log/batch`；
+    失败时按带抖动的指数退避重试，队列写满时丢弃最早的日志而不是无限增长。
+    配置了 `spool` 时，重试后仍失败的批次写入本地暂存区，并在下一次上报成功后或空闲时由同一线程回放。
+    每次上报或回放前都调用 `consent` 确认用户仍允许数据收集；用户撤回同意后，队列与本地暂存区中的日志全部丢弃。
+    """
+    def __init__(self, batch_url, session, prepare=None, spool=None, consent=None):
+        self.batch_url = batch_url
+        self.session = session
+        self.prepare = prepare
+        self.spool = spool
+        self.consent = consent
+
+        self._queue = deque(maxlen=UPLOAD_QUEUE_SIZE)
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._deadline = None
+        self._last_drain_attempt = time.monotonic() - SPOOL_RETRY_INTERVAL
+        self.total_sent = 0
+        self.total_dropped = 0
+
+        self._thread = threading.Thread(target=self._run, name="TelemetryUploader", daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        """返回上报队列的状态。"""
+        return {
+            "queued": len(self._queue),
+            "totalSent": self.total_sent,
+            "totalDropped": self.total_dropped,
+        }
+
+    def enqueue(self, item):
+        """放入一条待上报的日志，不等待。队列已满时最早的一条被丢弃。"""
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                self.total_dropped += 1
+            self._queue.append((time.monotonic(), item))
+            # 队列由空变为非空时也要唤醒上报线程，使其开始按 `UPLOAD_MAX_AGE` 计时，而不是一直等到凑满一批。
+            if len(self._queue) == 1 or len(self._queue) >= UPLOAD_BATCH_SIZE:
+                self._condition.notify()
+
+    def discard(self):
+        """丢弃队列与本地暂存区中的全部日志，用于用户撤回数据收集同意时。"""
+        with self._condition:
+            discarded = len(self._queue)
+            self._queue.clear()
+            self.total_dropped += discarded
+        if self.spool is not None:
+            discarded += self.spool.clear()
+        if discarded:
+            logging.info(f"用户已禁用数据收集，已丢弃 {discarded} 条未上报的日志。")
+
+    def close(self, timeout=3.0):
+        """停止接收新日志，并在 `timeout` 秒内尽量上报队列中剩余的日志，未能上报的日志随后写入本地暂存区。"""
+        with self._condition:
+            self._stopping = True
+            self._deadline = time.monotonic() + timeout
+            self._condition.notify()
+        self._thread.join(timeout + CLOSE_SPOOL_GRACE)
+        if self._thread.is_alive() and self.spool is not None and self._allowed():
+            # 上报线程仍阻塞在截止前已发出的请求中，由调用线程将队列中剩余的日志写入本地暂存区。
+            with self._condition:
+                batch = [self._queue.popleft()[1] for _ in range(len(self._queue))]
+            if batch:
+                self.spool.append(gzip.compress(self._encode(batch)), len(batch))
+        remaining = len(self._queue)
+        if remaining:
+            logging.warning(f"退出时仍有 {remaining} 条日志未能上报，已丢弃。")
+        if self.spool is not None and not self._thread.is_alive():
+            self.spool.close()
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                with self._condition:
+                    while not self._stopping:
+                        if len(self._queue) >= UPLOAD_BATCH_SIZE:
+                            break
+                        if self._queue:
+                            wait = self._queue[0][0] + UPLOAD_MAX_AGE - time.monotonic()
+                            if wait <= 0:
+                                break
+                            self._condition.wait(wait)
+                        elif self._spool_pending():
+                            wait = self._last_drain_attempt + SPOOL_RETRY_INTERVAL - time.monotonic()
+                            if wait <= 0:
+                                break
+                            self._condition.wait(wait)
+                        else:
+                            self._condition.wait()
+                    if self._stopping and time.monotonic() >= self._deadline:
+                        batch = [self._queue.popleft()[1] for _ in range(len(self._queue))]
+                        if batch and self.spool is not None and self._allowed():
+                            self.spool.append(gzip.compress(self._encode(batch)), len(batch))
+                        return
+                    if self._stopping and not self._queue:
+                        return
+                    batch = [self._queue.popleft()[1] for _ in range(min(UPLOAD_BATCH_SIZE, len(self._queue)))]
+                if not self._allowed():
+                    self.total_dropped += len(batch)
+                    self._last_drain_attempt = time.monotonic()
+                    self.discard()
+                elif batch:
+                    delivered = self._send(batch)
+                    batch = []
+                    if delivered and self._spool_pending() and not self._stopping:
+                        self._drain()
+                else:
+                    self._drain()
+            except Exception as e:
+                # 单次处理出错（如本地暂存区的数据库错误或无法序列化的日志）不应终止唯一的上报线程。
+                self.total_dropped += len(batch)
+                logging.error(f"日志上报线程处理 {len(batch)} 条日志时出错，已跳过并继续运行: {e}")
+
+    def _allowed(self):
+        return self.consent is None or bool(self.consent())
+
+    def _encode(self, batch):
+        if self.prepare is not None:
+            batch = [self.prepare(item) for item in batch]
+        return json.dumps(batch, ensure_ascii=False).encode('utf-8')
+
+    def _spool_pending(self):
+        return self.spool is not None and not self.spool.is_empty()
+
+    def _send(self, batch):
+        """上报一个批次，重试后仍失败时写入本地暂存区。后台可达（无论是否接受）时返回 True。"""
+        body = self._encode(batch)
+        compressed = len(body) > LOG_COMPRESS_THRESHOLD
+        if compressed:
+            body = gzip.compress(body)
+
+        result = self._post(body, compressed, UPLOAD_MAX_RETRIES)
+        if result is None:
+            if self.spool is not None and self._allowed():
+                self.spool.append(body if compressed else gzip.compress(body), len(batch))
+            else:
+                self.total_dropped += len(batch)
+                logging.error(f"批量上报 {len(batch)} 条日志失败，已丢弃。")
+            return False
+        if result:
+            self.total_sent += len(batch)
+        return True
+
+    def _drain(self):
+        """按写入顺序回放本地暂存的批次，遇到失败或有新日志等待上报时停止。"""
+        self._last_drain_attempt = time.monotonic()
+        started = time.monotonic()
+        drained = 0
+        while not self._stopping and len(self._queue) < UPLOAD_BATCH_SIZE and self._allowed():
+            row = self.spool.peek()
+            if row is None:
+                break
+            batch_id, event_count, body = row
+            result = self._post(body, True, 0)
+            if result is None:
+                break
+            self.spool.remove(batch_id)
+            if result:
+                self.total_sent += event_count
+            drained += event_count
+        if drained:
+            self.spool.last_drain_rate = drained / max(time.monotonic() - started, 1e-6)
+            logging.info(f"已回放 {drained} 条本地暂存日志。")
+
+    def _post(self, body, compressed, max_retries):
+        """上报一个批次。成功返回 True，被后端拒绝（不应重试）返回 False，重试后仍失败返回 None。"""
+        headers = {'Content-Type': 'application/json'}
+        if compressed:
+            headers['Content-Encoding'] = 'gzip'
+
+        for attempt in range(max_retries + 1):
+            retry_after = None
+            timeout = 10
+            if self._deadline is not None:
+                # 退出过程中请求不能超过截止时间，否则 `close()` 返回时本批次与队列中剩余的日志既未上报也未暂存。
+                timeout = min(timeout, self._deadline - time.monotonic())
+                if timeout <= 0:
+                    break
+            try:
+                response = self.session.post(self.batch_url, data=body, headers=headers, timeout=timeout)
+                if response.status_code < 500 and response.status_code != 429:
+                    if not response.ok:
+                        logging.error(f"批量上报日志被拒绝: HTTP {response.status_code}")
+                    return response.ok
+                retry_after = response.headers.get("Retry-After")
+                logging.warning(f"批量上报日志失败: HTTP {response.status_code}")
+            except requests.exceptions.RequestException as e:
+                logging.warning(f"批量上报日志失败: {e}")
+
+            if attempt == max_retries:
+                break
+            delay = random.uniform(0, min(UPLOAD_BACKOFF_MAX, UPLOAD_BACKOFF_BASE * 2 ** attempt))
+            if retry_after is not None and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            if self._deadline is not None and time.monotonic() + delay >= self._deadline:
+                break
+            time.sleep(delay)
+        return None
@@ -0,0 +1,120 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+
+from starlette.responses import JSONResponse
+
+from .metrics import Counter
+
+log = logging.getLogger(__name__)
+
+INGEST_REJECTED = Counter("ingest_rejected_total", "因超出准入限制被拒绝的日志上报请求数", ("reason",))
+
+
+class AdmissionRejected(Exception):
+    """请求超出准入限制，应以 429 拒绝。"""
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    日志上报接口的准入控制。
+    同时限制正在处理的上报请求数、写入队列的占用比例以及每个客户端IP的令牌桶速率，超出任一限制时
+    立即拒绝，而不是让请求无限排队。只作用于上报接口，不影响 `/version_check` 与 `/ocr_captcha`。
+    """
+    def __init__(self, writer, max_in_flight=256, queue_high_watermark=0.9,
+                 rate_per_ip=20.0, burst_per_ip=40.0, retry_after=1, max_tracked_ips=10000):
+        self.writer = writer
+        self.max_in_flight = max_in_flight
+        self.queue_high_watermark = queue_high_watermark
+        self.rate_per_ip = rate_per_ip
+        self.burst_per_ip = burst_per_ip
+        self.retry_after = retry_after
+        self.max_tracked_ips = max_tracked_ips
+
+        self.in_flight = 0
+        self._buckets = OrderedDict()
+        self.rejected = {"in_flight": 0, "queue": 0, "rate": 0}
+
+    def enter(self, client_ip):
+        """申请一个上报名额，超出限制时抛出 `AdmissionRejected`。成功后必须调用 `leave`。"""
+        if self.in_flight >= self.max_in_flight:
+            raise self._rejection("in_flight", self.retry_after)
+        if self.writer.fill_ratio() >= self.queue_high_watermark:
+            raise self._rejection("queue", self.retry_after)
+        if self.rate_per_ip > 0:
+            self._take_token(client_ip)
+        self.in_flight += 1
+
+    def leave(self):
+        """归还上报名额。"""
+        self.in_flight -= 1
+
+    def queue_full(self):
+        """记录一次因写入队列已满而被拒绝的请求，并返回对应的拒绝信息。"""
+        return self._rejection("queue", self.retry_after)
+
+    def _take_token(self, client_ip):
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(client_ip, (self.burst_per_ip, now))
+        tokens = min(self.burst_per_ip, tokens + (now - updated_at) * self.rate_per_ip)
+        if tokens < 1:
+            self._buckets[client_ip] = (tokens, now)
+            raise self._rejection("rate", max(1, math.ceil((1 - tokens) / self.rate_per_ip)))
+        self._buckets[client_ip] = (tokens - 1, now)
+        while len(self._buckets) > self.max_tracked_ips:
+            self._buckets.popitem(last=False)
+
+    def _rejection(self, reason, retry_after):
+        self.rejected[reason] += 1
+        INGEST_REJECTED.inc(reason)
+        return AdmissionRejected(reason, retry_after)
+
+    def stats(self):
+        """返回准入控制的配置与拒绝计数。"""
+        return {
+            "inFlight": self.in_flight,
+            "maxInFlight": self.max_in_flight,
+            "queueHighWatermark": self.queue_high_watermark,
+            "ratePerIp": self.rate_per_ip,
+            "burstPerIp": self.burst_per_ip,
+            "trackedIps": len(self._buckets),
+            "rejected": dict(self.rejected),
+        }
+
+
+def too_many_requests(rejection):
+    """构造带 `Retry-After` 头的 429 响应。"""
+    return JSONResponse(
+        {"detail": f"Log ingestion is over capacity ({rejection.reason}), retry later."},
+        status_code=429,
+        headers={"Retry-After": str(rejection.retry_after)}
+    )
+
+
+class AdmissionMiddleware:
+    """在读取请求体之前对上报接口执行准入控制，超限请求直接返回 429。"""
+    def __init__(self, app, controller, paths):
+        self.app = app
+        self.controller = controller
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        try:
+            self.controller.enter(client[0] if client else "unknown")
+        except AdmissionRejected as rejection:
+            await too_many_requests(rejection)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.leave()
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from .indexes import MANAGED_PREFIX
+
+log = logging.getLogger(__name__)
+
+# 需要去重的字段：(所在子文档, 字段名)。去重后原字段被移除，改为保存 `<字段名>Blob` 哈希引用。
+# 请求头改由 `header_sets.HeaderSetStore` 驻留，但早期写入的 `request.headersBlob` 仍需还原。
+BLOB_FIELDS = [("response", "body")]
+REHYDRATE_FIELDS = BLOB_FIELDS + [("request", "headers")]
+
+
+def canonical_json(value):
+    """生成与键顺序无关的规范化JSON字节串，用于计算内容哈希。"""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def last_seen_indexes():
+    """声明 `blobs` 与 `header_sets` 集合的索引：`lastSeen` 索引用于清理不再被任何日志引用的内容。"""
+    return [IndexModel([("lastSeen", ASCENDING)], name=f"{MANAGED_PREFIX}lastSeen")]
+
+
+class BlobStore:
+    """
+    大字段的内容寻址存储。
+    超过阈值的 `response.body` 按规范化JSON的SHA-256哈希只在 `blobs` 集合中保存一份，
+    并记录最近一次被引用的时间 `lastSeen`；日志文档中只保留哈希，读取时再透明还原。
+    早于最早一条日志的blob不再被引用，由 `ReferenceSweeper` 定期删除。
+    """
+    def __init__(self, collection, min_size=1024):
+        self.collection = collection
+        self.min_size = min_size
+
+        self.total_externalized = 0
+        self.total_bytes_saved = 0
+        self.total_swept = 0
+
+    def externalize(self, documents):
+        """将一批日志中的大字段写入 `blobs` 集合，并替换为哈希引用。blob写入失败时不修改日志文档。"""
+        replacements = []
+        refs = Counter()
+        blobs = {}
+        for document in documents:
+            for parent, field in BLOB_FIELDS:
+                container = document.get(parent)
+                if not container or container.get(field) is None:
+                    continue
+                data = canonical_json(container[field])
+                if len(data) < self.min_size:
+                    continue
+                digest = hashlib.sha256(data).hexdigest()
+                replacements.append((container, field, digest))
+                refs[digest] += 1
+                blobs[digest] = (container[field], len(data))
+
+        if not replacements:
+            return
+        now = datetime.utcnow()
+        digests = list(refs)
+        result = self.collection.bulk_write([
+            UpdateOne(
+                {"_id": digest},
+                {"$setOnInsert": {"data": blobs[digest][0], "size": blobs[digest][1], "createdAt": now},
+                 "$max": {"lastSeen": now}},
+                upsert=True
+            )
+            for digest in digests
+        ], ordered=False)
+
+        for container, field, digest in replacements:
+            del container[field]
+            container[f"{field}Blob"] = digest
+        self.total_externalized += len(replacements)
+        new_blobs = {digests[index] for index in result.upserted_ids}
+        self.total_bytes_saved += sum(
+            blobs[digest][1] * (refs[digest] - (1 if digest in new_blobs else 0)) for digest in digests
+        )
+
+    def rehydrate(self, documents):
+        """将日志文档中的哈希引用还原为原始内容。"""
+        digests = {
+            document[parent][f"{field}Blob"]
+            for document in documents
+            for parent, field in REHYDRATE_FIELDS
+            if isinstance(document.get(parent), dict) and f"{field}Blob" in document[parent]
+        }
+        if not digests:
+            return documents
+        data = {blob["_id"]: blob["data"] for blob in self.collection.find({"_id": {"$in": list(digests)}})}
+        for document in documents:
+            for parent, field in REHYDRATE_FIELDS:
+                container = document.get(parent)
+                if isinstance(container, dict) and f"{field}Blob" in container:
+                    digest = container.pop(f"{field}Blob")
+                    container[field] = data.get(digest)
+        return documents
+
+    def sweep(self, before):
+        """删除 `before` 之前最后一次被引用的blob，返回删除条数。"""
+        deleted = self.collection.delete_many({"lastSeen": {"$lt": before}}).deleted_count
+        self.total_swept += deleted
+        return deleted
+
+    def stats(self):
+        """返回去重统计。"""
+        return {
+            "minSize": self.min_size,
+            "totalExternalized": self.total_externalized,
+            "bytesSaved": self.total_bytes_saved,
+            "totalSwept": self.total_swept,
+        }
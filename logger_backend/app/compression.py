@@ -0,0 +1,138 @@
+import io
+import logging
+import zlib
+
+from starlette.responses import JSONResponse
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyTooLarge(Exception):
+    """解压后的请求体超出大小限制。"""
+
+
+class GzipBodyDecoder:
+    """流式解压gzip请求体，每次最多输出到剩余额度为止，防止压缩炸弹。"""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._chunks = []
+
+    def feed(self, data):
+        while data:
+            output = self._decompressor.decompress(data, self.max_size - self.size + 1)
+            self._append(output)
+            data = self._decompressor.unconsumed_tail
+
+    def finish(self):
+        self._append(self._decompressor.flush())
+        if not self._decompressor.eof:
+            raise zlib.error("incomplete gzip stream")
+        return b"".join(self._chunks)
+
+    def _append(self, output):
+        self.size += len(output)
+        if self.size > self.max_size:
+            raise BodyTooLarge()
+        self._chunks.append(output)
+
+
+class ZstdBodyDecoder:
+    """解压zstd请求体。压缩数据先按同样的上限缓存，再通过流式读取器分块解压并限制输出大小。"""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._compressed = bytearray()
+
+    def feed(self, data):
+        self._compressed.extend(data)
+        if len(self._compressed) > self.max_size:
+            raise BodyTooLarge()
+
+    def finish(self):
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(bytes(self._compressed)))
+        chunks = []
+        size = 0
+        while True:
+            chunk = reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > self.max_size:
+                raise BodyTooLarge()
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+
+class DecompressionMiddleware:
+    """
+    为指定路径解压 `Content-Encoding: gzip` 或 `zstd` 的请求体。
+    请求体边接收边解压，解压后超过 `max_size` 时立即返回 413；解压后的请求体以未压缩的形式交给后续处理。
+    """
+    def __init__(self, app, paths, max_size=10 * 1024 * 1024):
+        self.app = app
+        self.paths = set(paths)
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        encoding = headers.get(b"content-encoding", b"").decode("latin-1").strip().lower()
+        if encoding in ("", "identity"):
+            await self.app(scope, receive, send)
+            return
+
+        if encoding == "gzip":
+            decoder = GzipBodyDecoder(self.max_size)
+        elif encoding == "zstd" and zstandard is not None:
+            decoder = ZstdBodyDecoder(self.max_size)
+        else:
+            response = JSONResponse({"detail": f"Unsupported Content-Encoding: {encoding}"}, status_code=415)
+            await response(scope, receive, send)
+            return
+
+        try:
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                decoder.feed(message.get("body", b""))
+                more_body = message.get("more_body", False)
+            body = decoder.finish()
+        except BodyTooLarge:
+            log.warning(f"{scope['path']} 的请求体解压后超过 {self.max_size} 字节，已拒绝。")
+            response = JSONResponse({"detail": "Decompressed request body too large."}, status_code=413)
+            await response(scope, receive, send)
+            return
+        except Exception as e:
+            log.warning(f"{scope['path']} 的请求体解压失败: {e}")
+            response = JSONResponse({"detail": "Request body could not be decompressed."}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ] + [(b"content-length", str(len(body)).encode("latin-1"))]
+
+        body_sent = False
+
+        async def decompressed_receive():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, decompressed_receive, send)
@@ -0,0 +1,108 @@
+import json
+import logging
+import zlib
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from .queries import build_log_query, decode_cursor, encode_cursor, log_projection
+
+log = logging.getLogger(__name__)
+
+# 与 `/logs` 使用同一组 `(字段, timestamp, _id)` 索引，升序导出时反向遍历索引即可，无需在服务端排序。
+EXPORT_SORT = [("timestamp", ASCENDING), ("_id", ASCENDING)]
+
+# 被替换为引用保存的字段及其引用字段名；投影选择整个子文档时引用字段已包含在内，无需额外添加。
+REFERENCE_FIELDS = [
+    ("response.body", "response.bodyBlob"),
+    ("request.headers", "request.headersRef"),
+    ("request.headers", "request.headersBlob"),
+    ("response.headers", "response.headersRef"),
+]
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def build_export_query(cursor=None, **filters):
+    """在 `/logs` 的过滤条件基础上增加 `(timestamp, _id)` 大于游标的条件，用于连接中断后从最后收到的一条继续导出。"""
+    query = build_log_query(**filters)
+    if cursor is None:
+        return query
+    last_timestamp, last_id = decode_cursor(cursor)
+    return {"$and": [query, {"$or": [
+        {"timestamp": {"$gt": last_timestamp}},
+        {"timestamp": last_timestamp, "_id": {"$gt": last_id}},
+    ]}]}
+
+
+def export_projection(fields=None, include_body=False):
+    """
+    导出的字段投影。指定 `fields` 时只返回这些字段（`_id` 与生成续传游标所需的 `timestamp` 始终返回），
+    包含 `response.body` 或请求/响应头时一并返回其引用，以便还原。
+    """
+    if not fields:
+        return log_projection(include_body)
+    projection = {field: 1 for field in fields}
+    projection["timestamp"] = 1
+    for field, reference in REFERENCE_FIELDS:
+        if field in projection:
+            projection[reference] = 1
+    return projection
+
+
+class LogExporter:
+    """
+    以NDJSON流式导出日志。
+    使用按 `(timestamp, _id)` 升序的服务端游标逐批读取，每批通过 `rehydrate` 还原大字段引用并序列化后立即输出，内存占用只与批大小有关；
+    每行带有 `id` 与 `cursor`，中断后以最后一行的 `cursor` 作为 `cursor` 参数重新请求即可继续。
+    """
+    def __init__(self, collection, rehydrate, batch_size=1000):
+        self.collection = collection
+        self.rehydrate = rehydrate
+        self.batch_size = batch_size
+
+    def stream(self, query, projection, compress=False):
+        """同步生成器，逐批产出NDJSON字节块；`compress` 为真时输出gzip流。"""
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+        exported = 0
+        cursor = self.collection.find(query, projection, sort=EXPORT_SORT, batch_size=self.batch_size)
+        try:
+            batch = []
+            for document in cursor:
+                batch.append(document)
+                if len(batch) >= self.batch_size:
+                    chunk = self._encode(batch)
+                    exported += len(batch)
+                    batch = []
+                    if compressor is not None:
+                        chunk = compressor.compress(chunk)
+                    if chunk:
+                        yield chunk
+            if batch:
+                chunk = self._encode(batch)
+                exported += len(batch)
+                yield compressor.compress(chunk) if compressor is not None else chunk
+            if compressor is not None:
+                yield compressor.flush()
+            log.info(f"日志导出完成，共 {exported} 条。")
+        except Exception as e:
+            # 响应头已经发出，无法再返回错误状态码；客户端可用最后一行的 id 续传。
+            log.error(f"日志导出在第 {exported} 条之后中断: {e}")
+        finally:
+            cursor.close()
+
+    def _encode(self, documents):
+        self.rehydrate(documents)
+        lines = []
+        for document in documents:
+            document["cursor"] = encode_cursor(document)
+            document["id"] = str(document.pop("_id"))
+            lines.append(json.dumps(document, ensure_ascii=False, default=json_default))
+        return ("\n".join(lines) + "\n").encode("utf-8")
@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from .blobs import canonical_json
+
+log = logging.getLogger(__name__)
+
+# 需要驻留的请求头字段：(所在子文档, 字段名)。驻留后原字段被移除，改为保存 `<字段名>Ref` 引用。
+HEADER_FIELDS = [("request", "headers"), ("response", "headers")]
+
+
+class HeaderSetStore:
+    """
+    请求头集合的驻留存储。
+    同一客户端的请求头与平台的响应头在大量日志之间几乎完全相同，每个不同的头部字典按规范化JSON的哈希
+    只在 `header_sets` 集合中保存一份，日志文档中只保留引用。进程内用有界LRU记住已写入的哈希及其内容，
+    已知的头部集合不再访问数据库，读取时也优先从LRU还原。
+    每个头部集合记录最近一次被引用的时间 `lastSeen`，已知的集合最多每 `touch_interval` 秒刷新一次，
+    因此 `lastSeen` 最多比实际引用时间早 `touch_interval` 秒；不再被引用的集合由 `ReferenceSweeper` 定期删除。
+    """
+    def __init__(self, collection, max_cached=10000, touch_interval=3600.0):
+        self.collection = collection
+        self.max_cached = max_cached
+        self.touch_interval = touch_interval
+
+        self._lock = threading.Lock()
+        self._known = OrderedDict()
+
+        self.total_interned = 0
+        self.total_new_sets = 0
+        self.total_bytes_saved = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.total_swept = 0
+
+    def intern(self, documents):
+        """
+        将一批日志中的头部字典替换为引用，新出现的头部集合先写入 `header_sets` 集合，
+        超过 `touch_interval` 未刷新的已知集合同时更新 `lastSeen`。写入失败时不修改日志文档。
+        """
+        replacements = []
+        pending = {}
+        now = time.monotonic()
+        for document in documents:
+            for parent, field in HEADER_FIELDS:
+                container = document.get(parent)
+                if not container or not container.get(field):
+                    continue
+                data = canonical_json(container[field])
+                digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+                replacements.append((container, field, digest, len(data)))
+                if digest not in pending and self._needs_write(digest, now):
+                    pending[digest] = container[field]
+
+        if not replacements:
+            return
+        if pending:
+            written_at = datetime.utcnow()
+            digests = list(pending)
+            result = self.collection.bulk_write([
+                UpdateOne({"_id": digest},
+                          {"$setOnInsert": {"data": pending[digest], "createdAt": written_at},
+                           "$max": {"lastSeen": written_at}},
+                          upsert=True)
+                for digest in digests
+            ], ordered=False)
+            for digest in digests:
+                self._remember(digest, pending[digest], now)
+            self.total_new_sets += len(result.upserted_ids)
+
+        for container, field, digest, size in replacements:
+            del container[field]
+            container[f"{field}Ref"] = digest
+            self.total_bytes_saved += size - len(digest)
+        self.total_interned += len(replacements)
+
+    def rehydrate(self, documents):
+        """将日志文档中的头部引用还原为原始字典。"""
+        digests = {
+            document[parent][f"{field}Ref"]
+            for document in documents
+            for parent, field in HEADER_FIELDS
+            if isinstance(document.get(parent), dict) and f"{field}Ref" in document[parent]
+        }
+        if not digests:
+            return documents
+
+        data = {}
+        with self._lock:
+            for digest in digests:
+                if digest in self._known:
+                    self._known.move_to_end(digest)
+                    data[digest] = self._known[digest][0]
+        missing = [digest for digest in digests if digest not in data]
+        self.cache_hits += len(data)
+        self.cache_misses += len(missing)
+        if missing:
+            for header_set in self.collection.find({"_id": {"$in": missing}}):
+                data[header_set["_id"]] = header_set["data"]
+                # 读取时加载的集合尚未在本进程中刷新过 `lastSeen`，下次被引用时需要写入。
+                self._remember(header_set["_id"], header_set["data"], None)
+
+        for document in documents:
+            for parent, field in HEADER_FIELDS:
+                container = document.get(parent)
+                if isinstance(container, dict) and f"{field}Ref" in container:
+                    digest = container.pop(f"{field}Ref")
+                    container[field] = data.get(digest)
+        return documents
+
+    def sweep(self, before):
+        """删除 `before` 之前最后一次被引用的头部集合，并从LRU中移除，返回删除条数。"""
+        digests = [header_set["_id"] for header_set in self.collection.find({"lastSeen": {"$lt": before}}, {"_id": 1})]
+        if not digests:
+            return 0
+        with self._lock:
+            for digest in digests:
+                self._known.pop(digest, None)
+        deleted = self.collection.delete_many({"_id": {"$in": digests}, "lastSeen": {"$lt": before}}).deleted_count
+        self.total_swept += deleted
+        return deleted
+
+    def stats(self):
+        """返回驻留统计与LRU命中情况。"""
+        return {
+            "cachedSets": len(self._known),
+            "maxCached": self.max_cached,
+            "totalInterned": self.total_interned,
+            "totalNewSets": self.total_new_sets,
+            "bytesSaved": self.total_bytes_saved,
+            "cacheHits": self.cache_hits,
+            "cacheMisses": self.cache_misses,
+            "totalSwept": self.total_swept,
+        }
+
+    def _needs_write(self, digest, now):
+        """未知的集合，或超过 `touch_interval` 未刷新 `lastSeen` 的已知集合需要写入。"""
+        with self._lock:
+            if digest not in self._known:
+                return True
+            self._known.move_to_end(digest)
+            touched_at = self._known[digest][1]
+            return touched_at is None or now - touched_at >= self.touch_interval
+
+    def _remember(self, digest, headers, touched_at):
+        with self._lock:
+            self._known[digest] = (headers, touched_at)
+            self._known.move_to_end(digest)
+            while len(self._known) > self.max_cached:
+                self._known.popitem(last=False)
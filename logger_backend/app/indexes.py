@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import threading
+import time
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+log = logging.getLogger(__name__)
+
+MANAGED_PREFIX = "managed_"
+
+
+def log_indexes(retention_days):
+    """
+    声明 `logs` 集合需要维护的索引。`retention_days` 为 0 时不创建TTL索引。
+    每个查询过滤字段都带有 `(timestamp, _id)` 后缀，以支持 `/logs` 的键集分页。
+    """
+    indexes = [
+        IndexModel([(field, ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name=f"{MANAGED_PREFIX}{field}_timestamp")
+        for field in ("eventType", "studentId", "studentNo", "outcome")
+    ]
+    indexes.append(IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name=f"{MANAGED_PREFIX}timestamp"))
+    if retention_days > 0:
+        indexes.append(IndexModel([("createdAt", ASCENDING)], name=f"{MANAGED_PREFIX}createdAt_ttl",
+                                  expireAfterSeconds=int(retention_days * 86400)))
+    return indexes
+
+
+class IndexManager:
+    """
+    按声明维护集合上的索引。
+    名称以 `managed_` 开头的索引由本类管理：缺失的会被创建，键定义变化的会被重建，TTL变化时通过 `collMod`
+    原地修改，不再声明的会被删除。其他索引保持不变。
+    """
+    def __init__(self, collection, indexes, progress_interval=5.0):
+        self.collection = collection
+        self.indexes = indexes
+        self.progress_interval = progress_interval
+
+    def reconcile(self):
+        """使集合上的受管索引与声明保持一致。"""
+        existing = self.collection.index_information()
+        declared = {model.document["name"]: model for model in self.indexes}
+
+        for name, info in existing.items():
+            if name.startswith(MANAGED_PREFIX) and name not in declared:
+                log.info(f"删除不再声明的索引: {self.collection.name}.{name}")
+                self.collection.drop_index(name)
+
+        for name, model in declared.items():
+            spec = model.document
+            current = existing.get(name)
+            if current is not None and list(current["key"]) == list(spec["key"].items()):
+                if current.get("expireAfterSeconds") != spec.get("expireAfterSeconds"):
+                    log.info(f"更新索引TTL: {self.collection.name}.{name} -> {spec.get('expireAfterSeconds')}秒")
+                    self.collection.database.command(
+                        "collMod", self.collection.name,
+                        index={"name": name, "expireAfterSeconds": spec["expireAfterSeconds"]}
+                    )
+                continue
+            if current is not None:
+                log.info(f"索引定义已变化，重建索引: {self.collection.name}.{name}")
+                self.collection.drop_index(name)
+            self._build(model)
+
+    def _build(self, model):
+        name = model.document["name"]
+        log.info(f"开始创建索引: {self.collection.name}.{name}")
+        started = time.monotonic()
+        finished = threading.Event()
+        monitor = threading.Thread(target=self._report_progress, args=(name, started, finished),
+                                   name="IndexBuildMonitor", daemon=True)
+        monitor.start()
+        try:
+            self.collection.create_indexes([model])
+        finally:
+            finished.set()
+        log.info(f"索引创建完成: {self.collection.name}.{name}，耗时 {time.monotonic() - started:.1f} 秒")
+
+    def _report_progress(self, name, started, finished):
+        while not finished.wait(self.progress_interval):
+            try:
+                ops = self.collection.database.client.admin.aggregate([
+                    {"$currentOp": {"allUsers": True}},
+                    {"$match": {"command.createIndexes": self.collection.name}}
+                ])
+                for op in ops:
+                    progress = op.get("progress") or {}
+                    if progress.get("total"):
+                        log.info(f"索引 {self.collection.name}.{name} 创建中: {op.get('msg', '')} "
+                                 f"{progress.get('done')}/{progress.get('total')}")
+                        break
+                else:
+                    log.info(f"索引 {self.collection.name}.{name} 创建中，已耗时 {time.monotonic() - started:.0f} 秒")
+            except Exception as e:
+                log.warning(f"无法获取索引创建进度: {e}")
+                return
+
+    def describe(self):
+        """返回集合上所有索引的定义与占用空间。"""
+        index_sizes = self.collection.database.command("collStats", self.collection.name).get("indexSizes", {})
+        return [
+            {
+                "name": name,
+                "key": [[field, direction] for field, direction in info["key"]],
+                "expireAfterSeconds": info.get("expireAfterSeconds"),
+                "managed": name.startswith(MANAGED_PREFIX),
+                "sizeBytes": index_sizes.get(name, 0),
+            }
+            for name, info in self.collection.index_information().items()
+        ]
+
+
+class StorageBudget:
+    """
+    日志集合的空间预算。
+    后台任务定期读取 `collStats`，当磁盘上实际占用的数据空间（`storageSize` 减去可复用的 `freeStorageSize`）
+    与索引大小之和超出预算时，按 `_id` 从最早的日志开始分批删除。索引空间在删除后不会立即缩小，
+    因此某一轮删除后占用不再下降时即停止，等下一次检查再继续；仅索引就已超出预算时不删除。
+    `related` 中的集合（如日志引用的 `blobs` 与 `header_sets`）计入占用但不直接删除，
+    删除日志后调用 `after_delete` 清理其中不再被引用的内容。
+    """
+    def __init__(self, collection, budget_bytes, check_interval=300.0, delete_chunk=5000,
+                 related=(), after_delete=None):
+        self.collection = collection
+        self.budget_bytes = budget_bytes
+        self.check_interval = check_interval
+        self.delete_chunk = delete_chunk
+        self.related = list(related)
+        self.after_delete = after_delete
+
+        self._task = None
+        self.total_deleted = 0
+        self.last_used_bytes = None
+        self.last_checked_at = None
+
+    def start(self):
+        """启动后台检查任务。预算为 0 时不启用。"""
+        if self.budget_bytes <= 0:
+            return
+        self._task = asyncio.create_task(self._run(), name="StorageBudget")
+        log.info(f"日志空间预算已启用: {self.budget_bytes / 1024 / 1024:.0f} MB")
+
+    async def close(self):
+        """停止后台检查任务。"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.enforce)
+            except Exception as e:
+                log.error(f"执行日志空间预算检查失败: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def used_bytes(self):
+        """返回 `(总占用, 日志数据占用, 日志条数)`，总占用为日志集合与关联集合的数据占用加索引大小。"""
+        stats = self.collection.database.command("collStats", self.collection.name)
+        data = max(stats.get("storageSize", 0) - stats.get("freeStorageSize", 0), 0)
+        used = data + stats.get("totalIndexSize", 0)
+        for collection in self.related:
+            related_stats = collection.database.command("collStats", collection.name)
+            used += max(related_stats.get("storageSize", 0) - related_stats.get("freeStorageSize", 0), 0)
+            used += related_stats.get("totalIndexSize", 0)
+        return used, data, stats.get("count", 0)
+
+    def enforce(self):
+        """删除最早的日志，直到占用空间回到预算以内，或某一轮删除后占用不再下降。"""
+        used, data, count = self.used_bytes()
+        self.last_used_bytes = used
+        self.last_checked_at = time.time()
+        if used > self.budget_bytes and used - data >= self.budget_bytes:
+            log.error(f"索引与关联集合已占用 {(used - data) / 1024 / 1024:.0f} MB，超出空间预算，删除日志无法回到预算以内，请调大预算。")
+            return
+        deleted_before = self.total_deleted
+        while used > self.budget_bytes and count > 0 and data > 0:
+            excess = int((used - self.budget_bytes) / (data / count)) + 1
+            limit = min(excess, self.delete_chunk)
+            oldest = [doc["_id"] for doc in
+                      self.collection.find({}, {"_id": 1}).sort("_id", ASCENDING).limit(limit)]
+            if not oldest:
+                break
+            deleted = self.collection.delete_many({"_id": {"$in": oldest}}).deleted_count
+            self.total_deleted += deleted
+            log.warning(f"日志占用空间超出预算，已删除最早的 {deleted} 条日志。")
+            previous = used
+            used, data, count = self.used_bytes()
+            self.last_used_bytes = used
+            if used >= previous:
+                log.info("本轮删除后占用空间未下降，等待存储引擎回收空间后在下一次检查时继续。")
+                break
+        if self.after_delete is not None and self.total_deleted > deleted_before:
+            self.after_delete()
+            self.last_used_bytes = self.used_bytes()[0]
+
+    def stats(self):
+        """返回空间预算的执行情况。"""
+        return {
+            "budgetBytes": self.budget_bytes,
+            "usedBytes": self.last_used_bytes,
+            "lastCheckedAt": self.last_checked_at,
+            "totalDeleted": self.total_deleted,
+        }
@@ -1,61 +1,472 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Query, Depends
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import ValidationError
 from pymongo import MongoClient
-from .models import LogEntry
+from pymongo.errors import ConnectionFailure
+from bson import ObjectId
+from .models import LogEntry, LOG_ENTRY_ADAPTER
+from .writer import LogWriter
+from .spill import SpillLog
+from .ocr import OcrClient, SingleFlight
+from .ocr_cache import OcrResultCache, ocr_cache_key
+from .version import VersionManifest
+from .telemetry import TelemetryConfig
+from .indexes import IndexManager, StorageBudget, log_indexes
+from .queries import InvalidCursor, backfill_outcome, find_logs, outcome_of
+from .rollups import RollupAggregator, rollup_indexes
+from .blobs import BlobStore, last_seen_indexes
+from .header_sets import HeaderSetStore
+from .references import ReferenceSweeper
+from .tail import LogTail, record_data
+from .export import LogExporter, build_export_query, export_projection
+from .compression import DecompressionMiddleware
+from .admission import AdmissionController, AdmissionMiddleware, too_many_requests
+from .metrics import CallbackGauge, EventLoopLagMonitor, MetricsMiddleware, render_metrics
 import os
+import secrets
 import logging
+from datetime import datetime
+from typing import Optional, Literal
 import json
-import requests
+import asyncio
+import httpx
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongodb:27017/")
-client = MongoClient(MONGO_URI)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
 db = client.xinhua_platform_logs
 log_collection = db.logs
 
+INDEX_RETRY_INTERVAL = float(os.getenv("INDEX_RETRY_INTERVAL", "30"))
+LOG_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "180"))
+LOG_STORAGE_BUDGET_MB = float(os.getenv("LOG_STORAGE_BUDGET_MB", "0"))
+LOG_STORAGE_CHECK_INTERVAL = float(os.getenv("LOG_STORAGE_CHECK_INTERVAL", "300"))
+log_index_manager = IndexManager(log_collection, log_indexes(LOG_RETENTION_DAYS))
+
+LOG_QUEUE_MAX_SIZE = int(os.getenv("LOG_QUEUE_MAX_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.5"))
+LOG_BATCH_MAX_ITEMS = int(os.getenv("LOG_BATCH_MAX_ITEMS", "1000"))
+LOG_WRITE_TIMEOUT = float(os.getenv("LOG_WRITE_TIMEOUT", "10"))
+
+# 本地暂存区：MongoDB不可用或写入超时时日志先落盘，恢复后回放。SPILL_DIR 为空时关闭。
+SPILL_DIR = os.getenv("SPILL_DIR", "/code/spill")
+SPILL_SEGMENT_MAX_MB = float(os.getenv("SPILL_SEGMENT_MAX_MB", "16"))
+SPILL_REPLAY_INTERVAL = float(os.getenv("SPILL_REPLAY_INTERVAL", "5"))
+spill_log = SpillLog(SPILL_DIR, segment_max_bytes=int(SPILL_SEGMENT_MAX_MB * 1024 * 1024)) if SPILL_DIR else None
+log_writer = LogWriter(log_collection, max_queue_size=LOG_QUEUE_MAX_SIZE,
+                       batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL,
+                       write_timeout=LOG_WRITE_TIMEOUT, spill=spill_log,
+                       replay_interval=SPILL_REPLAY_INTERVAL)
+
+BLOB_MIN_SIZE = int(os.getenv("BLOB_MIN_SIZE", "1024"))
+blob_store = BlobStore(db.blobs, min_size=BLOB_MIN_SIZE)
+log_writer.add_pre_write_hook(blob_store.externalize)
+
+HEADER_SET_CACHE_SIZE = int(os.getenv("HEADER_SET_CACHE_SIZE", "10000"))
+HEADER_SET_TOUCH_INTERVAL = float(os.getenv("HEADER_SET_TOUCH_INTERVAL", "3600"))
+header_sets = HeaderSetStore(db.header_sets, max_cached=HEADER_SET_CACHE_SIZE, touch_interval=HEADER_SET_TOUCH_INTERVAL)
+log_writer.add_pre_write_hook(header_sets.intern)
+
+# 日志被TTL或空间预算删除后，定期清理 `blobs` 与 `header_sets` 中不再被引用的内容。
+REFERENCE_SWEEP_INTERVAL = float(os.getenv("REFERENCE_SWEEP_INTERVAL", "3600"))
+reference_sweeper = ReferenceSweeper(log_collection, [blob_store, header_sets], interval=REFERENCE_SWEEP_INTERVAL,
+                                     touch_interval=HEADER_SET_TOUCH_INTERVAL)
+reference_index_managers = [IndexManager(db.blobs, last_seen_indexes()), IndexManager(db.header_sets, last_seen_indexes())]
+log_storage_budget = StorageBudget(log_collection, int(LOG_STORAGE_BUDGET_MB * 1024 * 1024),
+                                   check_interval=LOG_STORAGE_CHECK_INTERVAL,
+                                   related=[db.blobs, db.header_sets], after_delete=reference_sweeper.sweep)
+
+def rehydrate_logs(documents):
+    """还原日志文档中的请求头引用与blob引用。"""
+    header_sets.rehydrate(documents)
+    return blob_store.rehydrate(documents)
+
+LOG_TAIL_BUFFER_SIZE = int(os.getenv("LOG_TAIL_BUFFER_SIZE", "1000"))
+LOG_TAIL_QUEUE_SIZE = int(os.getenv("LOG_TAIL_QUEUE_SIZE", "256"))
+LOG_TAIL_MAX_SUBSCRIBERS = int(os.getenv("LOG_TAIL_MAX_SUBSCRIBERS", "50"))
+LOG_TAIL_HEARTBEAT = float(os.getenv("LOG_TAIL_HEARTBEAT", "15"))
+log_tail = LogTail(buffer_size=LOG_TAIL_BUFFER_SIZE, queue_size=LOG_TAIL_QUEUE_SIZE,
+                   max_subscribers=LOG_TAIL_MAX_SUBSCRIBERS)
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+log_exporter = LogExporter(log_collection, rehydrate_logs, batch_size=EXPORT_BATCH_SIZE)
+
+rollup_collection = db.log_rollups
+rollup_aggregator = RollupAggregator(rollup_collection)
+rollup_index_manager = IndexManager(rollup_collection, rollup_indexes())
+log_writer.add_post_write_hook(rollup_aggregator.apply)
+
 OCR_API_URL = os.getenv("OCR_API_URL", "https://ocr.xiaoying.life/v1/school-captcha")
 if not OCR_API_URL:
     log.warning("OCR_API_URL 环境变量未设置，OCR功能可能无法正常工作。")
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "10"))
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "32"))
+OCR_HEDGE_ENABLED = os.getenv("OCR_HEDGE_ENABLED", "false").lower() == "true"
+OCR_HEDGE_PERCENTILE = float(os.getenv("OCR_HEDGE_PERCENTILE", "95"))
+OCR_HEDGE_DEFAULT_DELAY = float(os.getenv("OCR_HEDGE_DEFAULT_DELAY", "1.0"))
+OCR_HEDGE_MAX_RATIO = float(os.getenv("OCR_HEDGE_MAX_RATIO", "0.1"))
+ocr_client = OcrClient(OCR_API_URL, timeout=OCR_TIMEOUT, max_concurrency=OCR_MAX_CONCURRENCY,
+                       hedge_enabled=OCR_HEDGE_ENABLED, hedge_percentile=OCR_HEDGE_PERCENTILE,
+                       hedge_default_delay=OCR_HEDGE_DEFAULT_DELAY, hedge_max_ratio=OCR_HEDGE_MAX_RATIO)
+ocr_single_flight = SingleFlight()
+
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "4096"))
+OCR_CACHE_TTL = float(os.getenv("OCR_CACHE_TTL", "600"))
+OCR_CACHE_SQLITE_PATH = os.getenv("OCR_CACHE_SQLITE_PATH", "")
+ocr_cache = OcrResultCache(max_entries=OCR_CACHE_MAX_ENTRIES, ttl=OCR_CACHE_TTL, sqlite_path=OCR_CACHE_SQLITE_PATH)
 
 VERSION_INFO_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "version_info.json")
+VERSION_CHECK_MAX_AGE = int(os.getenv("VERSION_CHECK_MAX_AGE", "300"))
+version_manifest = VersionManifest(VERSION_INFO_FILE)
+
+TELEMETRY_POLICY_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "telemetry_policy.json")
+telemetry_config = TelemetryConfig(TELEMETRY_POLICY_FILE)
+
+# 管理接口（日志查询、导出、实时推送、状态、统计、指标与索引）的访问令牌，请求需携带 `Authorization: Bearer <ADMIN_TOKEN>`。
+# 未设置时这些接口一律拒绝访问。
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+if not ADMIN_TOKEN:
+    log.warning("ADMIN_TOKEN 环境变量未设置，管理接口已禁用。")
+
+# 写入前从请求参数中移除的字段，如登录请求中的密码哈希。
+REDACTED_PAYLOAD_FIELDS = {"pwd", "password", "newPwd", "oldPwd"}
 
 app = FastAPI(
     title="新华平台数据收集服务",
     description="一个用于接收、验证并存储客户端日志的严谨API服务。"
 )
 
+MAX_DECOMPRESSED_BODY_SIZE = int(os.getenv("MAX_DECOMPRESSED_BODY_SIZE", str(10 * 1024 * 1024)))
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "256"))
+INGEST_QUEUE_HIGH_WATERMARK = float(os.getenv("INGEST_QUEUE_HIGH_WATERMARK", "0.9"))
+# 按客户端IP限速默认关闭：服务部署在TLS代理之后，只有 uvicorn 通过 FORWARDED_ALLOW_IPS 信任代理地址时，
+# `scope["client"]` 才是真实客户端地址，否则所有客户端共用代理的令牌桶。
+INGEST_RATE_PER_IP = float(os.getenv("INGEST_RATE_PER_IP", "0"))
+INGEST_BURST_PER_IP = float(os.getenv("INGEST_BURST_PER_IP", "40"))
+INGEST_RETRY_AFTER = int(os.getenv("INGEST_RETRY_AFTER", "1"))
+if INGEST_RATE_PER_IP > 0 and not os.getenv("FORWARDED_ALLOW_IPS"):
+    log.warning("已开启按IP限速但未设置 FORWARDED_ALLOW_IPS，经代理转发的请求将共用代理地址的限额。")
+ingest_admission = AdmissionController(
+    log_writer, max_in_flight=INGEST_MAX_IN_FLIGHT, queue_high_watermark=INGEST_QUEUE_HIGH_WATERMARK,
+    rate_per_ip=INGEST_RATE_PER_IP, burst_per_ip=INGEST_BURST_PER_IP, retry_after=INGEST_RETRY_AFTER
+)
+
+INGEST_PATHS = ["/log", "/log/batch"]
+app.add_middleware(DecompressionMiddleware, paths=INGEST_PATHS, max_size=MAX_DECOMPRESSED_BODY_SIZE)
+app.add_middleware(AdmissionMiddleware, controller=ingest_admission, paths=INGEST_PATHS)
+app.add_middleware(MetricsMiddleware, paths=INGEST_PATHS)
+
+event_loop_lag_monitor = EventLoopLagMonitor()
+CallbackGauge("log_writer_queue_depth", "日志写入队列中等待写入的条数", lambda: log_writer.stats()["queueDepth"])
+CallbackGauge("log_writer_mongo_available", "MongoDB当前是否可直接写入（1为可写，0为写入本地暂存区）",
+              lambda: int(log_writer.mongo_available))
+if spill_log is not None:
+    CallbackGauge("spill_pending_bytes", "本地暂存区中等待回放的字节数", lambda: spill_log.stats()["pendingBytes"])
+    CallbackGauge("spill_documents_total", "写入本地暂存区的日志条数", lambda: spill_log.total_spilled, kind="counter")
+    CallbackGauge("spill_replayed_documents_total", "从本地暂存区回放的日志条数", lambda: spill_log.total_replayed, kind="counter")
+CallbackGauge("ingest_in_flight", "正在处理的日志上报请求数", lambda: ingest_admission.in_flight)
+CallbackGauge("ocr_upstream_in_flight", "正在进行的上游OCR请求数", lambda: ocr_client.in_flight)
+CallbackGauge("ocr_cache_hits_total", "OCR结果缓存命中次数", lambda: ocr_cache.hits, kind="counter")
+CallbackGauge("ocr_cache_misses_total", "OCR结果缓存未命中次数", lambda: ocr_cache.misses, kind="counter")
+CallbackGauge("ocr_coalesced_total", "被合并的相同OCR请求数", lambda: ocr_single_flight.coalesced, kind="counter")
+
 @app.on_event("startup")
-def startup_db_client():
+async def startup_db_client():
     try:
-        client.admin.command('ping')
+        await asyncio.to_thread(client.admin.command, 'ping')
         log.info("成功连接到MongoDB。")
     except Exception as e:
-        log.error(f"无法连接到MongoDB: {e}")
-        raise e
+        # 以降级模式启动：日志照常接收并写入本地暂存区，索引维护推迟到MongoDB恢复之后。
+        log.error(f"无法连接到MongoDB: {e}，服务以降级模式启动。")
+        log_writer.mongo_available = False
+    log_writer.start()
+    ocr_client.start()
+    ocr_cache.start()
+    app.state.index_task = asyncio.create_task(reconcile_indexes())
+    app.state.outcome_task = asyncio.create_task(backfill_log_outcomes())
+    log_storage_budget.start()
+    reference_sweeper.start()
+    event_loop_lag_monitor.start()
+
+async def reconcile_indexes():
+    """在后台线程中维护日志集合的索引，避免大集合上的索引构建阻塞服务启动。MongoDB不可达时定期重试。"""
+    pending = [log_index_manager, rollup_index_manager, *reference_index_managers]
+    while pending:
+        for index_manager in list(pending):
+            try:
+                await asyncio.to_thread(index_manager.reconcile)
+                pending.remove(index_manager)
+            except ConnectionFailure as e:
+                log.warning(f"MongoDB不可达，稍后重试维护集合 {index_manager.collection.name} 的索引: {e}")
+            except Exception as e:
+                log.error(f"维护集合 {index_manager.collection.name} 的索引失败: {e}")
+                pending.remove(index_manager)
+        if pending:
+            await asyncio.sleep(INDEX_RETRY_INTERVAL)
+
+async def backfill_log_outcomes():
+    """在索引维护完成后为历史日志补上 `outcome` 字段，使 `/logs` 的 `outcome` 过滤覆盖旧数据。MongoDB不可达时定期重试。"""
+    await app.state.index_task
+    while True:
+        try:
+            updated = await asyncio.to_thread(backfill_outcome, log_collection)
+            if updated:
+                log.info(f"已为 {updated} 条历史日志补上调用结果字段。")
+            return
+        except ConnectionFailure as e:
+            log.warning(f"MongoDB不可达，稍后重试为历史日志补上调用结果字段: {e}")
+        except Exception as e:
+            log.error(f"为历史日志补上调用结果字段失败: {e}")
+            return
+        await asyncio.sleep(INDEX_RETRY_INTERVAL)
 
 @app.on_event("shutdown")
-def shutdown_db_client():
+async def shutdown_db_client():
+    await event_loop_lag_monitor.close()
+    await log_storage_budget.close()
+    await reference_sweeper.close()
+    await ocr_client.close()
+    ocr_cache.close()
+    await log_writer.close()
     client.close()
     log.info("MongoDB连接已关闭。")
 
+def require_admin(request: Request):
+    """校验管理接口的访问令牌。"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled.")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token.", headers={"WWW-Authenticate": "Bearer"})
+
+def build_log_document(log_data: LogEntry, client_ip: str) -> dict:
+    """为已校验的日志生成待写入MongoDB的文档，移除请求参数中的密码字段，以服务端策略中的采样率替换客户端上报的值，并预先分配文档ID。"""
+    log_data.client_ip = client_ip
+    if log_data.sample_rate is not None:
+        log_data.sample_rate = telemetry_config.sample_rate(log_data.event_type)
+    payload = log_data.request.payload
+    if payload and not REDACTED_PAYLOAD_FIELDS.isdisjoint(payload):
+        log_data.request.payload = {key: "[REDACTED]" if key in REDACTED_PAYLOAD_FIELDS else value
+                                    for key, value in payload.items()}
+    log_dict = log_data.model_dump(by_alias=True, exclude_none=True)
+    log_dict["_id"] = ObjectId()
+    outcome = outcome_of(log_data.event_type)
+    if outcome is not None:
+        log_dict["outcome"] = outcome
+    return log_dict
+
+def parse_batch_body(body: bytes, content_type: str) -> list:
+    """
+    将批量请求体解析为原始条目列表。
+    支持 JSON 数组与 NDJSON（每行一个JSON对象）两种格式；NDJSON 的每一行以原始字节保留，
+    交给 `validate_log_item` 直接从字节校验，无法解析的行在逐条结果中报告。
+    """
+    if "ndjson" not in content_type and body.lstrip().startswith(b"["):
+        items = json.loads(body)
+        if not isinstance(items, list):
+            raise ValueError("Request body must be a JSON array.")
+        return items
+    return [line for line in body.splitlines() if line.strip()]
+
+def validate_log_item(item) -> LogEntry:
+    """校验批量请求中的一个条目：NDJSON 行直接从字节校验，JSON 数组元素从已解析的对象校验。"""
+    if isinstance(item, bytes):
+        return LOG_ENTRY_ADAPTER.validate_json(item)
+    return LOG_ENTRY_ADAPTER.validate_python(item)
+
+def validation_error_details(e: ValidationError) -> list:
+    """将校验错误转换为与 FastAPI 请求体校验一致的错误列表。"""
+    return [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+
+def fast_json_response(content, status_code: int = 200) -> Response:
+    """
+    直接序列化上报接口的响应，跳过 `response_model` 校验与 `jsonable_encoder`。
+    安装了 orjson 时使用 orjson，否则回退到标准库 json。
+    """
+    if orjson is not None:
+        return ORJSONResponse(content, status_code=status_code)
+    return JSONResponse(content, status_code=status_code)
+
+def queue_full_response():
+    """写入队列已满时返回 429，而不是让请求排队等待。"""
+    log.warning("日志写入队列已满，拒绝上报请求。")
+    return too_many_requests(ingest_admission.queue_full())
+
 @app.post("/log", status_code=201, response_model=dict)
-async def create_log_entry(log_data: LogEntry, request: Request):
-    """接收并存储一条新的日志记录。"""
+async def create_log_entry(request: Request):
+    """
+    接收一条新的日志记录，放入写入队列后由后台任务批量存储。写入队列已满时返回 429。
+    请求体由预编译的 `LOG_ENTRY_ADAPTER` 直接从原始字节校验，校验失败时返回与 FastAPI 一致的 422。
+    """
     try:
-        log_data.client_ip = request.client.host
-        
-        log_dict = log_data.model_dump(by_alias=True, exclude_none=True)
-        
-        result = log_collection.insert_one(log_dict)
-        log.info(f"成功接收并存储日志，文档ID: {result.inserted_id}")
-        
-        return {"message": "Log received successfully", "id": str(result.inserted_id)}
-        
+        log_data = LOG_ENTRY_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(validation_error_details(e))
+
+    try:
+        log_dict = build_log_document(log_data, request.client.host)
     except Exception as e:
         log.error(f"处理日志条目时发生错误: {e}")
         raise HTTPException(status_code=500, detail="Internal server error while processing log entry.")
 
+    if not log_writer.try_put(log_dict):
+        return queue_full_response()
+    log_tail.publish([log_dict])
+    return fast_json_response({"message": "Log received successfully", "id": str(log_dict["_id"])}, status_code=201)
+
+@app.post("/log/batch", response_model=dict)
+async def create_log_entries_batch(request: Request):
+    """批量接收日志记录（JSON数组或NDJSON），逐条校验后一次性放入写入队列，并返回逐条的接收结果。"""
+    try:
+        body = await request.body()
+        items = parse_batch_body(body, request.headers.get("content-type", ""))
+    except ValueError as e:
+        log.warning(f"批量日志请求体无法解析: {e}")
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON stream.")
+
+    if len(items) > LOG_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds the limit of {LOG_BATCH_MAX_ITEMS} entries.")
+
+    client_ip = request.client.host
+    documents = []
+    results = []
+    for index, item in enumerate(items):
+        try:
+            log_dict = build_log_document(validate_log_item(item), client_ip)
+        except ValidationError as e:
+            errors = e.errors(include_url=False)
+            if errors[0]["type"] == "json_invalid":
+                error = f"Invalid JSON: {errors[0]['ctx']['error']}"
+            else:
+                error = [{"loc": list(err["loc"]), "msg": err["msg"]} for err in errors]
+            results.append({"index": index, "status": "rejected", "error": error})
+            continue
+        documents.append(log_dict)
+        results.append({"index": index, "status": "accepted", "id": str(log_dict["_id"])})
+
+    if not log_writer.try_put_many(documents):
+        return queue_full_response()
+    log_tail.publish(documents)
+
+    log.info(f"批量日志处理完成: 接收 {len(documents)} 条，拒绝 {len(items) - len(documents)} 条。")
+    return fast_json_response({
+        "accepted": len(documents),
+        "rejected": len(items) - len(documents),
+        "results": results
+    })
+
+@app.get("/logs", response_model=dict, dependencies=[Depends(require_admin)])
+async def list_logs_endpoint(
+    event_type: Optional[str] = None,
+    student_id: Optional[str] = None,
+    student_no: Optional[str] = None,
+    outcome: Optional[Literal["success", "fail"]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    include_body: bool = False
+):
+    """按条件查询日志，使用 `(timestamp, _id)` 键集分页，默认不返回响应体。"""
+    try:
+        documents, next_cursor = await asyncio.to_thread(
+            find_logs, log_collection, limit, include_body=include_body,
+            event_type=event_type, student_id=student_id, student_no=student_no,
+            outcome=outcome, start=start, end=end, cursor=cursor
+        )
+        documents = await asyncio.to_thread(rehydrate_logs, documents)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+    except Exception as e:
+        log.error(f"查询日志时发生错误: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while querying logs.")
+
+    for document in documents:
+        document["id"] = str(document.pop("_id"))
+    return {"items": documents, "nextCursor": next_cursor}
+
+@app.get("/logs/export", dependencies=[Depends(require_admin)])
+async def export_logs_endpoint(
+    event_type: Optional[str] = None,
+    student_id: Optional[str] = None,
+    student_no: Optional[str] = None,
+    outcome: Optional[Literal["success", "fail"]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    include_body: bool = False,
+    compress: bool = False
+):
+    """
+    按条件以NDJSON流式导出日志，按 `(timestamp, _id)` 升序输出，`compress=true` 时输出gzip压缩的NDJSON。
+    `fields` 为逗号分隔的字段列表；连接中断后以最后收到的一行的 `cursor` 作为 `cursor` 参数继续导出。
+    """
+    try:
+        query = build_export_query(
+            cursor=cursor, event_type=event_type, student_id=student_id, student_no=student_no,
+            outcome=outcome, start=start, end=end
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    projection = export_projection(
+        [field.strip() for field in fields.split(",") if field.strip()] if fields else None, include_body
+    )
+
+    filename = "logs.ndjson.gz" if compress else "logs.ndjson"
+    return StreamingResponse(
+        log_exporter.stream(query, projection, compress=compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/logs/tail", dependencies=[Depends(require_admin)])
+async def tail_logs_endpoint(
+    request: Request,
+    event_type: Optional[str] = None,
+    student_id: Optional[str] = None,
+    student_no: Optional[str] = None,
+    backlog: int = Query(0, ge=0, le=1000)
+):
+    """
+    以 Server-Sent Events 实时推送新接收的日志，可按事件类型与学生过滤。
+    断线重连时携带 `Last-Event-ID` 可补发缓冲区中错过的日志；消费过慢的连接会收到 `dropped` 事件后被断开。
+    """
+    subscriber = log_tail.subscribe(
+        event_type=event_type, student_id=student_id, student_no=student_no,
+        last_event_id=request.headers.get("last-event-id"), backlog=backlog
+    )
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many live tail subscribers.")
+
+    async def events():
+        try:
+            while True:
+                try:
+                    records = await asyncio.wait_for(subscriber.queue.get(), LOG_TAIL_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if records is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                yield "".join(f"id: {record['id']}\ndata: {record_data(record)}\n\n" for record in records)
+        finally:
+            log_tail.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/ocr_captcha")
 async def ocr_captcha_endpoint(request: Request):
     """代理验证码OCR识别请求到第三方服务。"""
@@ -65,57 +476,49 @@ async def ocr_captcha_endpoint(request: Request):
     
     try:
         request_body = await request.json()
-        log.info(f"转发OCR请求到: {OCR_API_URL}")
-        
-        ocr_response = requests.post(OCR_API_URL, json=request_body, timeout=10)
-        ocr_response.raise_for_status()
-        
-        return ocr_response.json()
-    except requests.exceptions.RequestException as e:
-        log.error(f"OCR服务请求失败: {e}")
-        raise HTTPException(status_code=502, detail=f"OCR service communication error: {e}")
     except json.JSONDecodeError:
         log.error("接收到的OCR请求体不是有效的JSON。")
         raise HTTPException(status_code=400, detail="Invalid JSON request body.")
+
+    cache_key = ocr_cache_key(request_body)
+    if cache_key is not None:
+        cached_result = await ocr_cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
+
+    async def fetch_and_cache():
+        log.info(f"转发OCR请求到: {OCR_API_URL}")
+        result = await ocr_client.recognize(request_body)
+        await ocr_cache.set(cache_key, result)
+        return result
+
+    try:
+        if cache_key is None:
+            log.info(f"转发OCR请求到: {OCR_API_URL}")
+            return await ocr_client.recognize(request_body)
+        return await ocr_single_flight.do(cache_key, fetch_and_cache)
+    except asyncio.TimeoutError:
+        log.error(f"OCR服务请求超时（{OCR_TIMEOUT}秒）。")
+        raise HTTPException(status_code=504, detail="OCR service timed out.")
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        log.error(f"OCR服务请求失败: {e}")
+        raise HTTPException(status_code=502, detail=f"OCR service communication error: {e}")
     except Exception as e:
         log.error(f"处理OCR请求时发生未知错误: {e}")
         raise HTTPException(status_code=500, detail="Internal server error during OCR processing.")
 
 @app.get("/version_check")
-async def version_check_endpoint(client_version: str):
+async def version_check_endpoint(client_version: str, request: Request):
     """检查客户端版本并推送更新信息。"""
     try:
-        with open(VERSION_INFO_FILE, 'r', encoding='utf-8') as f:
-            version_info = json.load(f)
-        
-        latest_version_number = version_info.get("latestVersionNumber", "0.0.0")
-        latest_version_url = version_info.get("latestVersionUrl", "")
-        release_note = version_info.get("releaseNote", "")
-
-        should_update = False
-        try:
-            client_parts = [int(x) for x in client_version.split('.')]
-            latest_parts = [int(x) for x in latest_version_number.split('.')]
-
-            max_len = max(len(client_parts), len(latest_parts))
-            client_parts += [0] * (max_len - len(client_parts))
-            latest_parts += [0] * (max_len - len(latest_parts))
-            
-            if latest_parts > client_parts:
-                should_update = True
-        except ValueError:
-            log.warning(f"无法解析版本号：客户端'{client_version}', 最新'{latest_version_number}'")
-            should_update = False
-
-        response = {
-            "shouldUpdate": should_update
+        response, etag = version_manifest.check(client_version)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={VERSION_CHECK_MAX_AGE}"
         }
-        if should_update:
-            response["latestVersionUrl"] = latest_version_url
-            response["releaseNote"] = release_note
-        
-        log.info(f"客户端版本: {client_version}, 最新版本: {latest_version_number}, 是否更新: {should_update}")
-        return response
+        if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(content=response, headers=headers)
 
     except FileNotFoundError:
         log.error(f"版本信息文件未找到: {VERSION_INFO_FILE}")
@@ -127,6 +530,80 @@ async def version_check_endpoint(client_version: str):
         log.error(f"处理版本检查请求时发生错误: {e}")
         raise HTTPException(status_code=500, detail="Internal server error during version check.")
 
+@app.get("/telemetry_config")
+async def telemetry_config_endpoint(request: Request):
+    """下发客户端日志采样策略，客户端按 `Cache-Control` 缓存并在过期后携带 ETag 重新验证。"""
+    try:
+        policy, etag = telemetry_config.current()
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={telemetry_config.ttl()}"
+        }
+        if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(content=policy, headers=headers)
+
+    except FileNotFoundError:
+        log.error(f"日志采样策略文件未找到: {TELEMETRY_POLICY_FILE}")
+        raise HTTPException(status_code=404, detail="Telemetry policy not found.")
+    except ValueError as e:
+        log.error(f"日志采样策略文件格式错误: {e}")
+        raise HTTPException(status_code=500, detail="Telemetry policy file is malformed.")
+    except Exception as e:
+        log.error(f"处理采样策略请求时发生错误: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while loading telemetry policy.")
+
+@app.get("/status", response_model=dict, dependencies=[Depends(require_admin)])
+async def status_endpoint():
+    """返回服务内部组件的运行状态。"""
+    return {
+        "writer": log_writer.stats(),
+        "spill": spill_log.stats() if spill_log is not None else None,
+        "ocr": ocr_client.stats(),
+        "ocrCache": ocr_cache.stats(),
+        "ocrSingleFlight": ocr_single_flight.stats(),
+        "storage": log_storage_budget.stats(),
+        "rollups": rollup_aggregator.stats(),
+        "blobs": blob_store.stats(),
+        "headerSets": header_sets.stats(),
+        "referenceSweeper": reference_sweeper.stats(),
+        "tail": log_tail.stats(),
+        "admission": ingest_admission.stats()
+    }
+
+@app.get("/stats", response_model=dict, dependencies=[Depends(require_admin)])
+async def stats_endpoint(
+    start: datetime,
+    end: datetime,
+    granularity: Literal["minute", "hour"] = "hour",
+    event_type: Optional[str] = None,
+    outcome: Optional[Literal["success", "fail"]] = None
+):
+    """从预聚合的汇总集合读取按分钟或小时统计的API调用结果，`event_type` 不含 `_SUCCESS`/`_FAIL` 后缀。"""
+    try:
+        buckets = await asyncio.to_thread(
+            rollup_aggregator.query, granularity, start, end, event_type=event_type, outcome=outcome
+        )
+    except Exception as e:
+        log.error(f"查询统计数据时发生错误: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while querying statistics.")
+    return {"granularity": granularity, "buckets": buckets}
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def metrics_endpoint():
+    """以Prometheus文本格式输出服务指标。"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/indexes", response_model=dict, dependencies=[Depends(require_admin)])
+async def indexes_endpoint():
+    """列出日志集合的索引状态与占用空间。"""
+    try:
+        indexes = await asyncio.to_thread(log_index_manager.describe)
+    except Exception as e:
+        log.error(f"获取索引信息失败: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error while reading index information.")
+    return {"collection": log_collection.name, "indexes": indexes}
+
 @app.get("/", response_model=dict)
 def read_root():
     """根路径，用于健康检查。"""
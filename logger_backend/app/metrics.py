@@ -0,0 +1,215 @@
+import asyncio
+import bisect
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    """所有指标的基类，创建时自动注册到全局指标表。"""
+    kind = "untyped"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return lines
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """单调递增的计数器。"""
+    kind = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+                for labels, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """可增可减的瞬时值。"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+
+    def set(self, value, *label_values):
+        self._values[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+                for labels, value in self._values.items()]
+
+
+class CallbackGauge(Metric):
+    """在抓取时通过回调函数读取当前值的指标，适合暴露组件内部已有的计数。"""
+    def __init__(self, name, documentation, callback, kind="gauge"):
+        super().__init__(name, documentation)
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self):
+        try:
+            return [f"{self.name} {self.callback()}"]
+        except Exception as e:
+            log.warning(f"读取指标 {self.name} 失败: {e}")
+            return []
+
+
+class Histogram(Metric):
+    """固定分桶的直方图。"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+        self._values = {}
+
+    def observe(self, value, *label_values):
+        state = self._values.get(label_values)
+        if state is None:
+            state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        lines = []
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+def render_metrics():
+    """按Prometheus文本格式输出所有已注册的指标。"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP请求总数", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP请求处理耗时", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "正在处理的HTTP请求数")
+
+MONGO_WRITE_LATENCY = Histogram("mongo_write_duration_seconds", "日志批量写入MongoDB的耗时")
+MONGO_WRITE_BATCH_SIZE = Histogram("mongo_write_batch_size", "每次批量写入的日志条数", buckets=SIZE_BUCKETS)
+MONGO_WRITE_DOCUMENTS = Counter("mongo_write_documents_total", "批量写入的日志条数", ("result",))
+
+OCR_UPSTREAM_LATENCY = Histogram("ocr_upstream_duration_seconds", "单次上游OCR请求耗时")
+OCR_UPSTREAM_ERRORS = Counter("ocr_upstream_errors_total", "上游OCR请求错误数", ("error_class",))
+
+EVENT_LOOP_LAG = Histogram("event_loop_lag_seconds", "事件循环调度延迟",
+                           buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+
+class MetricsMiddleware:
+    """
+    记录每个请求的路由、状态码与处理耗时的ASGI中间件。
+    路由取匹配到的路径模板而非原始路径，避免标签基数随路径参数膨胀。
+    在路由之前就被准入控制或解压中间件拒绝的请求（429/413/415）没有匹配的路由，路径在 `paths` 中时按原始路径计入，
+    以便按路由观察上报接口的饱和情况。
+    """
+    def __init__(self, app, paths=()):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path", None)
+            if route_path is None:
+                route_path = scope["path"] if scope["path"] in self.paths else "unmatched"
+            HTTP_REQUESTS.inc(scope["method"], route_path, str(status))
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], route_path)
+
+
+class EventLoopLagMonitor:
+    """定期测量事件循环的实际唤醒时间与预期之差，用于发现阻塞事件循环的同步调用。"""
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self._task = None
+        self.last_lag = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="EventLoopLagMonitor")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, loop.time() - expected)
+            EVENT_LOOP_LAG.observe(self.last_lag)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import Optional, Dict, Any
 from datetime import datetime
 
@@ -37,5 +37,9 @@ class LogEntry(CamelCaseModel):
     error: Optional[str] = None
     
     client_ip: Optional[str] = None
+    sample_rate: Optional[float] = Field(default=None, gt=0, le=1)
     
-    created_at: datetime = Field(default_factory=datetime.utcnow, alias="createdAt")
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.utcnow, alias="createdAt")
+
+# 预先编译的校验器：上报接口直接用它校验原始请求体字节，省去先解析成dict再构造模型的过程。
+LOG_ENTRY_ADAPTER = TypeAdapter(LogEntry)
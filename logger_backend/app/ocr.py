@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+
+import httpx
+
+from .metrics import OCR_UPSTREAM_ERRORS, OCR_UPSTREAM_LATENCY
+
+log = logging.getLogger(__name__)
+
+
+class OcrClient:
+    """
+    第三方OCR服务的异步代理客户端。
+    在应用启动时创建共享的 `httpx.AsyncClient`（带keep-alive连接池），通过信号量限制并发上游请求数，
+    并为每次请求设置总截止时间，避免慢速上游拖垮整个事件循环。
+    """
+    def __init__(self, url, timeout=10.0, max_concurrency=32, max_keepalive=16,
+                 hedge_enabled=False, hedge_percentile=95.0, hedge_default_delay=1.0,
+                 hedge_min_delay=0.05, hedge_max_ratio=0.1, hedge_min_samples=20):
+        self.url = url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_keepalive = max_keepalive
+
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_ratio = hedge_max_ratio
+        self.hedge_min_samples = hedge_min_samples
+        self.attempt_latencies = deque(maxlen=1000)
+        self.attempt_errors = Counter()
+
+        self._client = None
+        self._semaphore = None
+
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_errors = 0
+        self.total_timeouts = 0
+        self.total_attempts = 0
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+
+    def start(self):
+        """创建共享的HTTP连接池与并发限制。"""
+        limits = httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=30.0
+        )
+        self._client = httpx.AsyncClient(limits=limits, timeout=self.timeout)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        log.info(f"OCR上游连接池已创建 (max_concurrency={self.max_concurrency}, timeout={self.timeout}s)。")
+
+    async def close(self):
+        """关闭共享连接池。"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            log.info("OCR上游连接池已关闭。")
+
+    async def recognize(self, payload):
+        """
+        将识别请求转发到上游OCR服务并返回其JSON结果。
+        `timeout` 是整个请求（含对冲请求与排队等待时间）的总截止时间；超时抛出 `asyncio.TimeoutError`，
+        上游错误抛出 `httpx.HTTPError`。
+        """
+        self.total_requests += 1
+        try:
+            return await asyncio.wait_for(self._recognize(payload), self.timeout)
+        except asyncio.TimeoutError:
+            self.total_timeouts += 1
+            OCR_UPSTREAM_ERRORS.inc("DeadlineExceeded")
+            raise
+        except Exception:
+            self.total_errors += 1
+            raise
+
+    async def _recognize(self, payload):
+        if not self.hedge_enabled:
+            return await self._attempt(payload)
+
+        primary = asyncio.create_task(self._attempt(payload))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay())
+            if done:
+                return primary.result()
+            if not self._may_hedge():
+                return await primary
+
+            self.hedged_requests += 1
+            hedge = asyncio.create_task(self._attempt(payload))
+            pending.add(hedge)
+            last_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def hedge_delay(self):
+        """根据近期单次请求耗时（含被取消请求的已耗时）的指定百分位数计算对冲延迟；样本不足时使用默认延迟。"""
+        if len(self.attempt_latencies) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, _percentile(self.attempt_latencies, self.hedge_percentile))
+
+    def _may_hedge(self):
+        return self.hedged_requests + 1 <= self.hedge_max_ratio * self.total_requests
+
+    async def _attempt(self, payload):
+        async with self._semaphore:
+            self.in_flight += 1
+            self.total_attempts += 1
+            started = time.perf_counter()
+            try:
+                response = await self._client.post(self.url, json=payload)
+                response.raise_for_status()
+                result = response.json()
+            except asyncio.CancelledError:
+                # 输掉对冲竞争或超过截止时间而被取消的请求也计入样本，以已耗时作为其耗时的下限；
+                # 只统计完成的请求会使百分位数只反映胜出者，对冲延迟逐渐偏小。
+                self.attempt_latencies.append(time.perf_counter() - started)
+                raise
+            except Exception as e:
+                self.attempt_errors[type(e).__name__] += 1
+                OCR_UPSTREAM_ERRORS.inc(type(e).__name__)
+                raise
+            finally:
+                self.in_flight -= 1
+            elapsed = time.perf_counter() - started
+            self.attempt_latencies.append(elapsed)
+            OCR_UPSTREAM_LATENCY.observe(elapsed)
+            return result
+
+    def stats(self):
+        """返回上游代理的运行状态。"""
+        return {
+            "inFlight": self.in_flight,
+            "maxConcurrency": self.max_concurrency,
+            "totalRequests": self.total_requests,
+            "totalErrors": self.total_errors,
+            "totalTimeouts": self.total_timeouts,
+            "totalAttempts": self.total_attempts,
+            "attemptErrors": dict(self.attempt_errors),
+            "attemptLatencyMs": {
+                "samples": len(self.attempt_latencies),
+                "p50": _percentile_ms(self.attempt_latencies, 50),
+                "p90": _percentile_ms(self.attempt_latencies, 90),
+                "p99": _percentile_ms(self.attempt_latencies, 99),
+            },
+            "hedge": {
+                "enabled": self.hedge_enabled,
+                "delayMs": round(self.hedge_delay() * 1000, 2),
+                "hedgedRequests": self.hedged_requests,
+                "hedgeWins": self.hedge_wins,
+                "maxRatio": self.hedge_max_ratio,
+            },
+        }
+
+
+def _percentile(samples, percentile):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _percentile_ms(samples, percentile):
+    if not samples:
+        return None
+    return round(_percentile(samples, percentile) * 1000, 2)
+
+
+class SingleFlight:
+    """
+    合并相同键的并发请求：同一时刻每个键只发起一次上游调用，其余并发请求等待同一个结果。
+    调用结束后立即移除该键，因此异常会传递给所有等待者，但不会被缓存。
+    """
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, func):
+        """以 `key` 为合并键执行协程函数 `func`，返回其结果或抛出其异常。"""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """返回合并情况统计，`coalesced` 即节省的上游调用次数。"""
+        return {
+            "inFlightKeys": len(self._calls),
+            "upstreamCalls": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,154 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+def ocr_cache_key(payload):
+    """
+    根据解码后的验证码图片字节计算缓存键。
+    请求体中除 `imageBase64` 外的其他字段也会参与计算；无法解码图片时返回 None，表示该请求不参与缓存。
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("imageBase64"), str):
+        return None
+    try:
+        image_bytes = base64.b64decode(payload["imageBase64"], validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+    digest = hashlib.sha256(image_bytes)
+    extra = {k: v for k, v in payload.items() if k != "imageBase64"}
+    if extra:
+        digest.update(json.dumps(extra, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class OcrResultCache:
+    """
+    OCR识别结果缓存，按图片内容哈希索引，支持TTL过期与LRU淘汰。
+    配置 `sqlite_path` 后，同一台机器上的多个worker进程可通过本地SQLite文件共享缓存结果。
+    """
+    def __init__(self, max_entries=4096, ttl=600.0, sqlite_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sqlite_path = sqlite_path or None
+
+        self._entries = OrderedDict()
+        self._sqlite_lock = threading.Lock()
+        self._sqlite = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_evictions = 0
+
+    def start(self):
+        """初始化可选的SQLite共享存储。"""
+        if not self.sqlite_path:
+            return
+        self._sqlite = sqlite3.connect(self.sqlite_path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._sqlite.execute("PRAGMA journal_mode=WAL")
+        self._sqlite.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            "key TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._sqlite.execute("CREATE INDEX IF NOT EXISTS ocr_cache_last_access ON ocr_cache (last_access)")
+        log.info(f"OCR结果缓存已启用SQLite共享存储: {self.sqlite_path}")
+
+    def close(self):
+        """关闭SQLite共享存储。"""
+        if self._sqlite is not None:
+            self._sqlite.close()
+            self._sqlite = None
+
+    async def get(self, key):
+        """读取缓存结果，未命中或已过期时返回 None。"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            del self._entries[key]
+            self.expirations += 1
+
+        if self._sqlite is not None:
+            shared = await asyncio.to_thread(self._sqlite_get, key)
+            if shared is not None:
+                remaining, result = shared
+                self._store(key, result, now + min(remaining, self.ttl))
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        return None
+
+    async def set(self, key, result):
+        """写入一条识别结果。"""
+        self._store(key, result, time.monotonic() + self.ttl)
+        if self._sqlite is not None:
+            await asyncio.to_thread(self._sqlite_set, key, result)
+
+    def _store(self, key, result, expires_at):
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _sqlite_get(self, key):
+        now = time.time()
+        with self._sqlite_lock:
+            row = self._sqlite.execute(
+                "SELECT result, expires_at FROM ocr_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._sqlite.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                self.expirations += 1
+                return None
+            self._sqlite.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (now, key))
+        return row[1] - now, json.loads(row[0])
+
+    def _sqlite_set(self, key, result):
+        now = time.time()
+        with self._sqlite_lock:
+            self._sqlite.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, result, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), now + self.ttl, now)
+            )
+            self._sqlite.execute("DELETE FROM ocr_cache WHERE expires_at <= ?", (now,))
+            evicted = self._sqlite.execute(
+                "DELETE FROM ocr_cache WHERE key IN ("
+                "SELECT key FROM ocr_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            self.shared_evictions += max(evicted, 0)
+
+    def stats(self):
+        """返回缓存命中、未命中与淘汰计数。"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl,
+            "shared": self._sqlite is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "sharedEvictions": self.shared_evictions,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
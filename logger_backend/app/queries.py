@@ -0,0 +1,102 @@
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+
+LOG_SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+
+LARGE_FIELDS = ["response.body", "response.bodyBlob"]
+
+
+class InvalidCursor(ValueError):
+    """分页游标无法解析。"""
+
+
+def outcome_of(event_type):
+    """根据事件类型的后缀推断调用结果。"""
+    if event_type.endswith("_SUCCESS"):
+        return "SUCCESS"
+    if event_type.endswith("_FAIL"):
+        return "FAIL"
+    return None
+
+
+def backfill_outcome(collection):
+    """为早于 `outcome` 字段写入的日志按事件类型后缀补上调用结果，返回更新条数。只处理缺少该字段的文档，重复执行开销很小。"""
+    updated = 0
+    for suffix, outcome in (("_SUCCESS", "SUCCESS"), ("_FAIL", "FAIL")):
+        updated += collection.update_many(
+            {"outcome": {"$exists": False}, "eventType": {"$regex": f"{suffix}$"}},
+            {"$set": {"outcome": outcome}}
+        ).modified_count
+    return updated
+
+
+def encode_cursor(document):
+    """将一页最后一条文档的 `(timestamp, _id)` 编码为不透明的游标字符串。"""
+    raw = json.dumps({"t": document["timestamp"].isoformat(), "i": str(document["_id"])})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 `(timestamp, _id)`。"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(raw["t"]), ObjectId(raw["i"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidCursor(str(e))
+
+
+def build_log_query(event_type=None, student_id=None, student_no=None, outcome=None,
+                    start=None, end=None, cursor=None):
+    """
+    根据过滤条件与游标构建查询条件。
+    每个等值过滤字段都有对应的 `(字段, timestamp, _id)` 索引（见 `indexes.log_indexes`），
+    排序与游标条件均可直接在索引上完成。
+    """
+    equality = {
+        "studentId": student_id,
+        "studentNo": student_no,
+        "eventType": event_type,
+        "outcome": outcome.upper() if outcome else None,
+    }
+    conditions = {field: value for field, value in equality.items() if value is not None}
+
+    time_range = {}
+    if start is not None:
+        time_range["$gte"] = start
+    if end is not None:
+        time_range["$lt"] = end
+    if time_range:
+        conditions["timestamp"] = time_range
+
+    query = conditions
+    if cursor is not None:
+        last_timestamp, last_id = decode_cursor(cursor)
+        query = {"$and": [conditions, {"$or": [
+            {"timestamp": {"$lt": last_timestamp}},
+            {"timestamp": last_timestamp, "_id": {"$lt": last_id}},
+        ]}]}
+
+    return query
+
+
+def log_projection(include_body=False):
+    """默认不返回体积较大的响应体字段。"""
+    if include_body:
+        return None
+    return {field: 0 for field in LARGE_FIELDS}
+
+
+def find_logs(collection, limit, include_body=False, **filters):
+    """按 `(timestamp, _id)` 倒序进行键集分页查询，返回 `(文档列表, 下一页游标)`。"""
+    query = build_log_query(**filters)
+    documents = list(collection.find(query, log_projection(include_body)).sort(LOG_SORT).limit(limit + 1))
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1])
+    return documents, next_cursor
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING
+
+log = logging.getLogger(__name__)
+
+
+class ReferenceSweeper:
+    """
+    清理 `blobs` 与 `header_sets` 中不再被任何日志引用的内容。
+    日志的 `_id` 在接收时生成，引用的内容在写入前记录 `lastSeen`（头部集合最多滞后 `touch_interval` 秒），
+    因此 `lastSeen` 早于现存最早一条日志的 `_id` 时间（再减去 `touch_interval` 与 `margin`）的内容已不可能被引用。
+    TTL过期与空间预算删除日志后，对应的内容在下一次清理时一并删除。
+    """
+    def __init__(self, log_collection, stores, interval=3600.0, touch_interval=3600.0, margin=3600.0):
+        self.log_collection = log_collection
+        self.stores = stores
+        self.interval = interval
+        self.touch_interval = touch_interval
+        self.margin = margin
+
+        self._task = None
+        self.total_swept = 0
+        self.last_swept_at = None
+
+    def start(self):
+        """启动后台清理任务。"""
+        self._task = asyncio.create_task(self._run(), name="ReferenceSweeper")
+
+    async def close(self):
+        """停止后台清理任务。"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                log.error(f"清理不再被引用的内容失败: {e}")
+
+    def sweep(self):
+        """删除早于现存最早一条日志的内容。日志集合为空时不清理，以免删除写入队列或本地暂存区中日志引用的内容。"""
+        now = datetime.utcnow()
+        for store in self.stores:
+            # 早期写入的文档没有 `lastSeen`，先按当前时间补上，之后按正常规则清理。
+            store.collection.update_many({"lastSeen": {"$exists": False}}, {"$set": {"lastSeen": now}})
+
+        oldest = self.log_collection.find_one({}, {"_id": 1}, sort=[("_id", ASCENDING)])
+        if oldest is None:
+            return
+        before = oldest["_id"].generation_time.replace(tzinfo=None) - timedelta(seconds=self.touch_interval + self.margin)
+        swept = {store.collection.name: store.sweep(before) for store in self.stores}
+        self.total_swept += sum(swept.values())
+        self.last_swept_at = time.time()
+        if any(swept.values()):
+            log.info(f"已清理不再被引用的内容: {swept}")
+
+    def stats(self):
+        """返回清理任务的执行情况。"""
+        return {
+            "interval": self.interval,
+            "totalSwept": self.total_swept,
+            "lastSweptAt": self.last_swept_at,
+        }
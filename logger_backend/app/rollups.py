@@ -0,0 +1,101 @@
+import logging
+from collections import Counter
+from datetime import timezone
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from .indexes import MANAGED_PREFIX
+
+log = logging.getLogger(__name__)
+
+GRANULARITIES = ("minute", "hour")
+
+
+def base_event_type(event_type):
+    """去掉事件类型的 `_SUCCESS`/`_FAIL` 后缀。"""
+    for suffix in ("_SUCCESS", "_FAIL"):
+        if event_type.endswith(suffix):
+            return event_type[:-len(suffix)]
+    return event_type
+
+
+def bucket_start(timestamp, granularity):
+    """将时间戳向下取整到分钟或小时，统一为UTC。"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    timestamp = timestamp.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        timestamp = timestamp.replace(minute=0)
+    return timestamp
+
+
+def rollup_indexes():
+    """声明汇总集合的索引：唯一键用于 `$inc` 更新，`eventType` 索引用于 `/stats` 查询。"""
+    return [
+        IndexModel([("granularity", ASCENDING), ("bucket", ASCENDING), ("eventType", ASCENDING),
+                    ("outcome", ASCENDING), ("statusCode", ASCENDING)],
+                   name=f"{MANAGED_PREFIX}rollup_key", unique=True),
+        IndexModel([("granularity", ASCENDING), ("eventType", ASCENDING), ("bucket", ASCENDING)],
+                   name=f"{MANAGED_PREFIX}eventType_bucket"),
+    ]
+
+
+class RollupAggregator:
+    """
+    按时间桶预聚合API调用结果。
+    每次批量写入日志后，将这一批日志按 `(粒度, 时间桶, 事件类型, 结果, 状态码)` 计数，
+    再以一次 `bulk_write` 的 `$inc` upsert 累加到汇总集合中。
+    客户端按采样策略只上报部分日志时，每条日志按 `1 / sampleRate`（写入前已替换为服务端策略中的采样率）计数（不取整，以免如采样率0.3时每条按3条计而系统性低估），汇总结果为估算的实际调用量，可能带有小数。
+    """
+    def __init__(self, collection):
+        self.collection = collection
+        self.total_updates = 0
+        self.total_failed = 0
+
+    def apply(self, documents):
+        """将一批已写入的日志累加到汇总集合。"""
+        counts = Counter()
+        for document in documents:
+            response = document.get("response") or {}
+            for granularity in GRANULARITIES:
+                counts[(
+                    granularity,
+                    bucket_start(document["timestamp"], granularity),
+                    base_event_type(document["eventType"]),
+                    document.get("outcome"),
+                    response.get("statusCode"),
+                )] += 1 / document.get("sampleRate", 1)
+
+        if not counts:
+            return
+        updates = [
+            UpdateOne(
+                {"granularity": granularity, "bucket": bucket, "eventType": event_type,
+                 "outcome": outcome, "statusCode": status_code},
+                {"$inc": {"count": count}},
+                upsert=True
+            )
+            for (granularity, bucket, event_type, outcome, status_code), count in counts.items()
+        ]
+        try:
+            self.collection.bulk_write(updates, ordered=False)
+            self.total_updates += len(updates)
+        except Exception as e:
+            self.total_failed += len(updates)
+            log.error(f"更新日志汇总失败: {e}")
+
+    def query(self, granularity, start, end, event_type=None, outcome=None):
+        """读取指定时间范围内的汇总数据，按时间桶升序返回。"""
+        query = {"granularity": granularity, "bucket": {"$gte": start, "$lt": end}}
+        if event_type is not None:
+            query["eventType"] = base_event_type(event_type)
+        if outcome is not None:
+            query["outcome"] = outcome.upper()
+        return list(self.collection.find(query, {"_id": 0, "granularity": 0}).sort("bucket", ASCENDING))
+
+    def stats(self):
+        """返回汇总更新的统计。"""
+        return {
+            "totalUpdates": self.total_updates,
+            "totalFailed": self.total_failed,
+        }
@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+
+from bson import json_util
+
+log = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".ndjson"
+JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+
+class SpillLog:
+    """
+    本地追加写入的日志暂存区，用于MongoDB不可用时保存已接收的日志。
+    每条记录写为一行 `<字节长度> <Extended JSON>`，读取时据此识别崩溃造成的不完整尾部记录。
+    每次追加一批记录后统一执行一次 fsync，单个分段超过 `segment_max_bytes` 后滚动到新分段。
+    """
+    def __init__(self, directory, segment_max_bytes=16 * 1024 * 1024):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_path = None
+        self._active_size = 0
+        self._next_sequence = 0
+
+        self.total_spilled = 0
+        self.total_replayed = 0
+
+    def open(self):
+        """创建暂存目录并扫描已有分段。"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self.segments()
+        if segments:
+            self._next_sequence = self._sequence_of(segments[-1]) + 1
+            log.warning(f"发现 {len(segments)} 个未回放的日志暂存分段，将在MongoDB可用后回放。")
+
+    def close(self):
+        """将当前分段落盘并关闭。"""
+        with self._lock:
+            self._seal_active()
+
+    def append(self, documents):
+        """追加一批日志文档并落盘。"""
+        if not documents:
+            return
+        with self._lock:
+            if self._active is None:
+                self._open_segment()
+            for document in documents:
+                payload = json_util.dumps(document, json_options=JSON_OPTIONS).encode("utf-8")
+                record = str(len(payload)).encode("ascii") + b" " + payload + b"\n"
+                self._active.write(record)
+                self._active_size += len(record)
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self.total_spilled += len(documents)
+            if self._active_size >= self.segment_max_bytes:
+                self._seal_active()
+
+    def seal(self):
+        """结束当前分段，使其中的记录可以被回放。"""
+        with self._lock:
+            self._seal_active()
+
+    def segments(self):
+        """按写入顺序返回所有已结束的分段路径。"""
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        paths = [os.path.join(self.directory, name) for name in names]
+        return [path for path in paths if path != self._active_path]
+
+    def read(self, path, batch_size):
+        """逐批读取分段中的日志文档。遇到不完整的尾部记录时停止读取。"""
+        batch = []
+        with open(path, "rb") as f:
+            for line in f:
+                document = self._decode(path, line)
+                if document is None:
+                    break
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def remove(self, path, replayed):
+        """删除已回放完毕的分段。"""
+        os.remove(path)
+        self.total_replayed += replayed
+
+    def is_empty(self):
+        """暂存区中没有任何待回放记录时返回 True。"""
+        with self._lock:
+            return self._active is None and not self.segments()
+
+    def stats(self):
+        """返回暂存区的分段数量、大小与累计写入/回放条数。"""
+        segments = self.segments()
+        pending_bytes = sum(os.path.getsize(path) for path in segments) + self._active_size
+        return {
+            "directory": self.directory,
+            "segments": len(segments) + (1 if self._active is not None else 0),
+            "pendingBytes": pending_bytes,
+            "totalSpilled": self.total_spilled,
+            "totalReplayed": self.total_replayed,
+        }
+
+    def _open_segment(self):
+        self._active_path = os.path.join(
+            self.directory, f"{SEGMENT_PREFIX}{self._next_sequence:012d}{SEGMENT_SUFFIX}"
+        )
+        self._next_sequence += 1
+        self._active = open(self._active_path, "ab")
+        self._active_size = 0
+        directory_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+    def _seal_active(self):
+        if self._active is None:
+            return
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._active.close()
+        self._active = None
+        self._active_path = None
+        self._active_size = 0
+
+    def _decode(self, path, line):
+        length, _, payload = line.partition(b" ")
+        if not line.endswith(b"\n") or not length.isdigit() or int(length) != len(payload) - 1:
+            log.warning(f"暂存分段 {os.path.basename(path)} 末尾存在不完整的记录，已忽略。")
+            return None
+        return json_util.loads(payload[:-1].decode("utf-8"), json_options=JSON_OPTIONS)
+
+    @staticmethod
+    def _sequence_of(path):
+        return int(os.path.basename(path)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+from collections import deque
+
+from .export import json_default
+
+log = logging.getLogger(__name__)
+
+# 写入前回调会原地替换这些子文档中的字段（请求头、响应体改为引用），缓冲区保存的快照需要复制它们。
+SNAPSHOT_FIELDS = ("request", "response")
+
+
+def record_data(record):
+    """返回记录的JSON文本。首次推送给订阅者时才序列化，之后所有订阅者共享同一份文本。"""
+    if record["data"] is None:
+        payload = {key: value for key, value in record["document"].items() if key != "_id"}
+        payload["id"] = record["id"]
+        record["data"] = json.dumps(payload, ensure_ascii=False, default=json_default)
+        record["document"] = None
+    return record["data"]
+
+
+class TailSubscriber:
+    """一个实时日志订阅者，持有有界队列与过滤条件。队列中的每一项是同一次上报中匹配的日志列表。"""
+    def __init__(self, queue_size, event_type=None, student_id=None, student_no=None):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.event_type = event_type
+        self.student_id = student_id
+        self.student_no = student_no
+        self.dropped = False
+
+    def matches(self, record):
+        return ((self.event_type is None or record["eventType"] == self.event_type)
+                and (self.student_id is None or record["studentId"] == self.student_id)
+                and (self.student_no is None or record["studentNo"] == self.student_no))
+
+
+class LogTail:
+    """
+    最近接收日志的内存环形缓冲区与实时分发。
+    接收时只保存文档的浅快照，不做序列化；日志第一次推送给订阅者时才序列化，之后所有订阅者共享同一份JSON文本。
+    没有订阅者且缓冲区关闭时直接跳过。分发使用 `put_nowait`，订阅者的队列写满时直接断开该订阅者，而不是让上报接口等待。
+    """
+    def __init__(self, buffer_size=1000, queue_size=256, max_subscribers=50):
+        self.buffer = deque(maxlen=buffer_size)
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+
+        self.total_published = 0
+        self.total_dropped = 0
+
+    def publish(self, documents):
+        """将一批已接收的日志放入环形缓冲区并分发给匹配的订阅者。需在写入队列取走文档之前同步调用。"""
+        self.total_published += len(documents)
+        if not self.subscribers and not self.buffer.maxlen:
+            return
+        records = []
+        for document in documents:
+            snapshot = dict(document)
+            for field in SNAPSHOT_FIELDS:
+                if isinstance(snapshot.get(field), dict):
+                    snapshot[field] = dict(snapshot[field])
+            record = {
+                "id": str(document["_id"]),
+                "eventType": document.get("eventType"),
+                "studentId": document.get("studentId"),
+                "studentNo": document.get("studentNo"),
+                "document": snapshot,
+                "data": None,
+            }
+            self.buffer.append(record)
+            records.append(record)
+        for subscriber in list(self.subscribers):
+            matched = [record for record in records if subscriber.matches(record)]
+            if matched:
+                self._offer(subscriber, matched)
+
+    def subscribe(self, event_type=None, student_id=None, student_no=None, last_event_id=None, backlog=0):
+        """
+        注册订阅者，订阅者数量已达上限时返回 None。
+        提供 `last_event_id` 时补发缓冲区中该条之后的日志，否则补发最近 `backlog` 条匹配的日志。
+        """
+        if len(self.subscribers) >= self.max_subscribers:
+            return None
+        subscriber = TailSubscriber(self.queue_size, event_type, student_id, student_no)
+        records = [record for record in self.buffer if subscriber.matches(record)]
+        if last_event_id is not None:
+            ids = [record["id"] for record in records]
+            records = records[ids.index(last_event_id) + 1:] if last_event_id in ids else records
+        else:
+            records = records[-backlog:] if backlog > 0 else []
+        if records:
+            subscriber.queue.put_nowait(records)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def stats(self):
+        """返回缓冲区与订阅者状态。"""
+        return {
+            "buffered": len(self.buffer),
+            "bufferSize": self.buffer.maxlen,
+            "subscribers": len(self.subscribers),
+            "maxSubscribers": self.max_subscribers,
+            "totalPublished": self.total_published,
+            "totalDropped": self.total_dropped,
+        }
+
+    def _offer(self, subscriber, records):
+        try:
+            subscriber.queue.put_nowait(records)
+        except asyncio.QueueFull:
+            # 清空队列后放入结束标记，订阅者读到后断开，释放其占用的内存。
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait(None)
+            subscriber.dropped = True
+            self.subscribers.discard(subscriber)
+            self.total_dropped += 1
+            log.warning("实时日志订阅者消费过慢，已断开。")
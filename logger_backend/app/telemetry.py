@@ -0,0 +1,86 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+
+
+def validate_policy(policy):
+    """检查采样策略的字段与取值范围，格式错误时抛出 `ValueError`。"""
+    if not isinstance(policy, dict):
+        raise ValueError("telemetry policy must be a JSON object")
+    rates = dict(policy.get("sampleRates", {}))
+    rates["defaultSampleRate"] = policy.get("defaultSampleRate", 1.0)
+    for name, rate in rates.items():
+        if not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+            raise ValueError(f"sample rate for {name} must be between 0 and 1")
+    for name in ("maxRequestPayloadBytes", "maxResponseBodyBytes", "ttlSeconds"):
+        value = policy.get(name)
+        if value is not None and (not isinstance(value, int) or value < 0):
+            raise ValueError(f"{name} must be a non-negative integer")
+
+
+class TelemetryConfig:
+    """
+    `telemetry_policy.json` 的内存缓存，下发给客户端的日志采样策略。
+    策略包括按事件类型的采样率、始终保留的事件后缀（如 `_FAIL`）以及请求/响应体的大小上限。
+    文件只在修改时间变化时重新读取并校验，响应内容与ETag随之预先生成。
+    """
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._policy = None
+        self._etag = None
+
+    def current(self):
+        """返回 `(策略, ETag)`，文件不存在时抛出 `FileNotFoundError`，格式错误时抛出 `ValueError`。"""
+        self._reload_if_changed()
+        return self._policy, self._etag
+
+    def ttl(self):
+        """客户端缓存策略的时长（秒）。"""
+        if self._policy is None:
+            return DEFAULT_TTL
+        return self._policy.get("ttlSeconds", DEFAULT_TTL)
+
+    def sample_rate(self, event_type):
+        """
+        返回策略中该事件类型的采样率，计算方式与客户端一致，用于替换客户端上报的 `sampleRate`，
+        避免伪造的极小采样率放大汇总统计。不采样、始终保留或策略无法加载时返回 None，按1条计数。
+        """
+        try:
+            policy, _ = self.current()
+        except (OSError, ValueError):
+            return None
+        if any(event_type.endswith(suffix) for suffix in policy.get("alwaysKeepSuffixes", [])):
+            return None
+        rate = policy.get("sampleRates", {}).get(event_type, policy.get("defaultSampleRate", 1.0))
+        return rate if 0 < rate < 1 else None
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            self._checked_at = now
+            if mtime == self._mtime:
+                return
+            with open(self.path, 'r', encoding='utf-8') as f:
+                policy = json.load(f)
+            validate_policy(policy)
+
+            body = json.dumps(policy, ensure_ascii=False, sort_keys=True).encode('utf-8')
+            self._policy = policy
+            self._etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            self._mtime = mtime
+            log.info(f"已加载日志采样策略，默认采样率: {policy.get('defaultSampleRate', 1.0)}")
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+def parse_version(version):
+    """将形如 `1.2.3` 的版本号解析为整数元组，无法解析时抛出 `ValueError`。"""
+    return tuple(int(x) for x in version.split('.'))
+
+
+def is_newer(latest, current):
+    """比较两个版本元组，缺失的位按 0 补齐。"""
+    max_len = max(len(latest), len(current))
+    return latest + (0,) * (max_len - len(latest)) > current + (0,) * (max_len - len(current))
+
+
+class VersionManifest:
+    """
+    `version_info.json` 的内存缓存。
+    文件只在修改时间变化时重新读取，最新版本号预先解析为元组；每个客户端版本的检查结果及其ETag
+    会被缓存在有界的LRU中，文件更新后整体失效。
+    """
+    def __init__(self, path, max_cached_responses=256, check_interval=1.0):
+        self.path = path
+        self.max_cached_responses = max_cached_responses
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._latest_number = "0.0.0"
+        self._latest_parts = None
+        self._latest_url = ""
+        self._release_note = ""
+        self._responses = OrderedDict()
+
+    def check(self, client_version):
+        """返回 `(响应内容, ETag)`，文件不存在或格式错误时分别抛出 `FileNotFoundError` 与 `json.JSONDecodeError`。"""
+        self._reload_if_changed()
+        cached = self._responses.get(client_version)
+        if cached is not None:
+            self._responses.move_to_end(client_version)
+            return cached
+
+        should_update = False
+        try:
+            if self._latest_parts is None:
+                raise ValueError(self._latest_number)
+            should_update = is_newer(self._latest_parts, parse_version(client_version))
+        except ValueError:
+            log.warning(f"无法解析版本号：客户端'{client_version}', 最新'{self._latest_number}'")
+            should_update = False
+
+        response = {
+            "shouldUpdate": should_update
+        }
+        if should_update:
+            response["latestVersionUrl"] = self._latest_url
+            response["releaseNote"] = self._release_note
+        log.info(f"客户端版本: {client_version}, 最新版本: {self._latest_number}, 是否更新: {should_update}")
+
+        body = json.dumps(response, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        cached = (response, etag)
+        self._responses[client_version] = cached
+        while len(self._responses) > self.max_cached_responses:
+            self._responses.popitem(last=False)
+        return cached
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            self._checked_at = now
+            if mtime == self._mtime:
+                return
+            with open(self.path, 'r', encoding='utf-8') as f:
+                version_info = json.load(f)
+
+            self._latest_number = version_info.get("latestVersionNumber", "0.0.0")
+            self._latest_url = version_info.get("latestVersionUrl", "")
+            self._release_note = version_info.get("releaseNote", "")
+            try:
+                self._latest_parts = parse_version(self._latest_number)
+            except ValueError:
+                self._latest_parts = None
+            self._responses.clear()
+            self._mtime = mtime
+            log.info(f"已加载版本信息文件，最新版本: {self._latest_number}")
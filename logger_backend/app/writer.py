@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pymongo
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .metrics import MONGO_WRITE_BATCH_SIZE, MONGO_WRITE_DOCUMENTS, MONGO_WRITE_LATENCY
+
+log = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class LogWriter:
+    """
+    日志批量写入管道。
+    已校验的日志文档先进入有界队列，由后台任务在达到数量或时间阈值时使用 `insert_many` 批量写入MongoDB，
+    避免每条日志都阻塞事件循环并产生一次数据库往返。
+    配置了 `spill` 时，MongoDB不可用或超时的批次写入本地暂存区，后台回放任务在MongoDB恢复后按原 `_id` 补写。
+    """
+    def __init__(self, collection, max_queue_size=10000, batch_size=500, flush_interval=0.5,
+                 write_timeout=None, spill=None, replay_interval=5.0):
+        self.collection = collection
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_timeout = write_timeout
+        self.spill = spill
+        self.replay_interval = replay_interval
+
+        self.queue = None
+        self._task = None
+        self._replay_task = None
+        self.mongo_available = True
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LogWriter")
+        self._pre_write_hooks = []
+        self._post_write_hooks = []
+
+        self.total_written = 0
+        self.total_failed = 0
+        self.flush_count = 0
+        self.last_flush_size = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    def add_pre_write_hook(self, hook):
+        """
+        注册批量写入前的回调，可原地修改待写入的文档。回调与 `insert_many` 共用同一个写入超时；
+        回调抛出的MongoDB错误按写入失败处理（整批写入本地暂存区），其他错误只记录日志并按原文档继续写入。
+        """
+        self._pre_write_hooks.append(hook)
+
+    def add_post_write_hook(self, hook):
+        """注册批量写入成功后的回调。回调在写入线程中以本批已写入的文档列表为参数同步调用。"""
+        self._post_write_hooks.append(hook)
+
+    def start(self):
+        """在当前事件循环中创建队列并启动后台写入任务。"""
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run(), name="LogWriter")
+        if self.spill is not None:
+            self.spill.open()
+            self._replay_task = asyncio.create_task(self._replay_loop(), name="LogWriterReplay")
+        log.info(f"日志批量写入任务已启动 (batch_size={self.batch_size}, flush_interval={self.flush_interval}s)。")
+
+    def try_put(self, document):
+        """将一条日志文档放入写入队列，队列已满时返回 False 而不等待。"""
+        return self.try_put_many([document])
+
+    def try_put_many(self, documents):
+        """将一批日志文档放入写入队列，由后台任务合并为同一次批量写入。剩余容量不足时整批拒绝并返回 False。"""
+        if self.max_queue_size - self.queue.qsize() < len(documents):
+            return False
+        for document in documents:
+            self.queue.put_nowait(document)
+        return True
+
+    def fill_ratio(self):
+        """返回写入队列的占用比例。"""
+        if self.queue is None:
+            return 0.0
+        return self.queue.qsize() / self.max_queue_size
+
+    async def close(self):
+        """停止接收新任务，并在退出前将队列中剩余的日志全部写入。"""
+        if self._task is None:
+            return
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            try:
+                await self._replay_task
+            except asyncio.CancelledError:
+                pass
+            self._replay_task = None
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+        self._executor.shutdown(wait=True)
+        if self.spill is not None:
+            self.spill.close()
+        log.info(f"日志写入队列已清空，累计写入 {self.total_written} 条。")
+
+    def stats(self):
+        """返回写入管道的运行状态，包括队列深度与写入延迟。"""
+        return {
+            "queueDepth": self.queue.qsize() if self.queue is not None else 0,
+            "queueCapacity": self.max_queue_size,
+            "totalWritten": self.total_written,
+            "totalFailed": self.total_failed,
+            "flushCount": self.flush_count,
+            "lastFlushSize": self.last_flush_size,
+            "lastFlushLatencyMs": round(self.last_flush_latency * 1000, 2),
+            "maxFlushLatencyMs": round(self.max_flush_latency * 1000, 2),
+            "mongoAvailable": self.mongo_available,
+        }
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            document = await self.queue.get()
+            if document is None:
+                stopping = True
+            else:
+                batch.append(document)
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        document = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if document is None:
+                        stopping = True
+                        break
+                    batch.append(document)
+
+            if stopping:
+                while not self.queue.empty():
+                    document = self.queue.get_nowait()
+                    if document is not None:
+                        batch.append(document)
+
+            for start in range(0, len(batch), self.batch_size):
+                await self._flush(batch[start:start + self.batch_size])
+
+    async def _flush(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch)
+        except Exception as e:
+            self.total_failed += len(batch)
+            log.error(f"批量写入 {len(batch)} 条日志失败: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            self.flush_count += 1
+            self.last_flush_size = len(batch)
+            self.last_flush_latency = elapsed
+            self.max_flush_latency = max(self.max_flush_latency, elapsed)
+
+    def _write(self, batch):
+        if self.spill is not None and not self.mongo_available:
+            self.spill.append(batch)
+            return
+        try:
+            self._store(batch)
+        except PyMongoError as e:
+            if self.spill is None or isinstance(e, BulkWriteError):
+                raise
+            self.mongo_available = False
+            self.spill.append(batch)
+            log.warning(f"MongoDB写入失败: {e}，{len(batch)} 条日志已写入本地暂存区，将在恢复后回放。")
+
+    def _store(self, batch, ignore_duplicates=False):
+        with pymongo.timeout(self.write_timeout):
+            self._run_pre_write_hooks(batch)
+            written = self._insert(batch, ignore_duplicates)
+
+        for hook in self._post_write_hooks:
+            try:
+                hook(written)
+            except Exception as e:
+                log.error(f"执行写入后回调失败: {e}")
+
+    def _run_pre_write_hooks(self, batch):
+        for hook in self._pre_write_hooks:
+            try:
+                hook(batch)
+            except PyMongoError:
+                raise
+            except Exception as e:
+                log.error(f"执行写入前回调失败: {e}")
+
+    def _insert(self, batch, ignore_duplicates):
+        written = batch
+        started = time.perf_counter()
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            failed = {error["index"] for error in errors}
+            written = [document for index, document in enumerate(batch) if index not in failed]
+            if ignore_duplicates:
+                errors = [error for error in errors if error.get("code") != DUPLICATE_KEY]
+            if errors:
+                self.total_failed += len(errors)
+                MONGO_WRITE_DOCUMENTS.inc("failed", amount=len(errors))
+                log.error(f"批量写入部分失败: {len(errors)}/{len(batch)} 条日志未写入。")
+        except Exception:
+            MONGO_WRITE_DOCUMENTS.inc("failed", amount=len(batch))
+            raise
+        finally:
+            MONGO_WRITE_LATENCY.observe(time.perf_counter() - started)
+            MONGO_WRITE_BATCH_SIZE.observe(len(batch))
+        self.total_written += len(written)
+        MONGO_WRITE_DOCUMENTS.inc("written", amount=len(written))
+        return written
+
+    async def _replay_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            if self.mongo_available and self.spill.is_empty():
+                continue
+            try:
+                await loop.run_in_executor(self._executor, self._replay)
+            except Exception as e:
+                log.warning(f"回放本地暂存日志失败，稍后重试: {e}")
+
+    def _replay(self):
+        # 与批量写入共用同一个单线程执行器，回放期间不会有新的批次同时追加到暂存区。
+        self.collection.database.client.admin.command("ping")
+        self.spill.seal()
+        for path in self.spill.segments():
+            replayed = 0
+            for batch in self.spill.read(path, self.batch_size):
+                self._store(batch, ignore_duplicates=True)
+                replayed += len(batch)
+            self.spill.remove(path, replayed)
+            log.info(f"已回放本地暂存分段 {path} 中的 {replayed} 条日志。")
+        if not self.mongo_available:
+            self.mongo_available = True
+            log.info("MongoDB已恢复，日志写入切换回直接写入模式。")